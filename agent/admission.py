@@ -0,0 +1,199 @@
+import re
+import time
+import heapq
+import asyncio
+import itertools
+from collections import Counter
+from contextlib import asynccontextmanager
+
+from agent import metrics
+from agent.memory import CallRecord
+from agent.tools import capture_lead, escalate_urgent_case
+from agent.triage import URGENT_REPLY, classify_urgency
+from agent.checkpoints import thread_config
+
+PHONE_NUMBER = re.compile(r"(?:\+?1[\s.-]?)?\(?\d{3}\)?[\s.-]?\d{3}[\s.-]?\d{4}")
+
+BUSY = "I'm sorry, all of our lines are very busy right now."
+MESSAGE_TAKEN = (
+    f"{BUSY} I've passed your message to our intake team, and an attorney "
+    "will call you back at {phone} {when}. Is there anything you'd like me to add?"
+)
+ASK_FOR_NUMBER = (
+    f"{BUSY} If you tell me your name and the best number to reach you, "
+    "I'll have an attorney call you back."
+)
+
+
+class Overloaded(Exception):
+    """No capacity to start a turn before its deadline."""
+
+    def __init__(self, reason: str, tenant: str):
+        super().__init__(f"turn shed ({reason}) for tenant {tenant}")
+        self.reason = reason
+        self.tenant = tenant
+
+
+class AdmissionController:
+    """Global and per-tenant limits on agent turns in flight.
+
+    Turns past ``capacity`` (or past ``tenant_capacity`` for one tenant)
+    wait in a queue of at most ``max_queue``, earliest deadline first, so
+    one busy firm can't take every Bedrock slot and a turn that has waited
+    too long is never started. A turn that finds the queue full, or whose
+    deadline passes while it waits, raises Overloaded instead; api.py then
+    answers without the model. Urgent turns are never queued or shed: they
+    take a slot straight away, even past the limits.
+    """
+
+    def __init__(self, capacity: int, tenant_capacity: int = None, max_queue: int = 64):
+        self.capacity = capacity
+        self.tenant_capacity = tenant_capacity or capacity
+        self.max_queue = max_queue
+        self.active = 0
+        self._active_by_tenant = Counter()
+        self._queue = []
+        self._sequence = itertools.count()
+        self._shed_by_tenant = Counter()
+
+    def _has_room(self, tenant: str) -> bool:
+        return self.active < self.capacity and self._active_by_tenant[tenant] < self.tenant_capacity
+
+    def _take(self, tenant: str):
+        self.active += 1
+        self._active_by_tenant[tenant] += 1
+
+    def _shed(self, reason: str, tenant: str):
+        metrics.count(f"turns_shed_{reason}")
+        self._shed_by_tenant[tenant] += 1
+        raise Overloaded(reason, tenant)
+
+    def _report(self):
+        metrics.set_gauge("admission_active_turns", self.active)
+        metrics.set_gauge("admission_queued_turns", len(self._queue))
+
+    async def acquire(self, tenant: str, deadline: float, urgent: bool = False):
+        """Wait for a slot. ``deadline`` is a time.monotonic() value."""
+        if urgent and not self._has_room(tenant):
+            metrics.count("turns_admitted_urgent")
+        if urgent or self._has_room(tenant):
+            self._take(tenant)
+            self._report()
+            return
+        if len(self._queue) >= self.max_queue:
+            self._shed("queue_full", tenant)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            self._shed("deadline", tenant)
+
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (deadline, next(self._sequence), tenant, waiter)
+        heapq.heappush(self._queue, entry)
+        self._report()
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), remaining)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done():
+                # Granted just as we gave up: pass the slot on.
+                self.release(tenant)
+            else:
+                waiter.cancel()
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                self._report()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._shed("deadline", tenant)
+        finally:
+            metrics.observe("admission_wait", time.perf_counter() - started)
+
+    def release(self, tenant: str):
+        self.active -= 1
+        self._active_by_tenant[tenant] -= 1
+        if self._active_by_tenant[tenant] <= 0:
+            del self._active_by_tenant[tenant]
+        self._dispatch()
+        self._report()
+
+    def _dispatch(self):
+        """Start queued turns, earliest deadline first, while there is room.
+
+        Expired turns are skipped; their own timeout sheds them.
+        """
+        now = time.monotonic()
+        skipped = []
+        while self._queue and self.active < self.capacity:
+            entry = heapq.heappop(self._queue)
+            deadline, _, tenant, waiter = entry
+            if deadline <= now or self._active_by_tenant[tenant] >= self.tenant_capacity:
+                skipped.append(entry)
+                continue
+            self._take(tenant)
+            waiter.set_result(True)
+        for entry in skipped:
+            heapq.heappush(self._queue, entry)
+
+    @asynccontextmanager
+    async def admit(self, tenant: str, deadline: float, urgent: bool = False):
+        await self.acquire(tenant, deadline, urgent)
+        try:
+            yield
+        finally:
+            self.release(tenant)
+
+    def stats(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "tenant_capacity": self.tenant_capacity,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queued": len(self._queue),
+            "active_by_tenant": dict(self._active_by_tenant),
+            "queued_by_tenant": dict(Counter(tenant for _, _, tenant, _ in self._queue)),
+            "shed_by_tenant": dict(self._shed_by_tenant)
+        }
+
+
+def take_message(caller_info: dict, message: str, session_id: str) -> tuple[str, dict]:
+    """Clara's reply to a shed turn, and the caller_info after it.
+
+    An emergency that hasn't been escalated yet is escalated here, with or
+    without a number, just as triage would. Otherwise, with a number to
+    call back (from Vapi or said in this turn) the caller's words are saved
+    through capture_lead, or Clara asks for one. Nothing here waits on
+    Bedrock.
+    """
+    record = CallRecord.from_caller_info(caller_info)
+    situation = classify_urgency(message or "")
+    if situation is not None and record.urgency != "urgent":
+        args = {
+            "caller_name": record.name or "Unknown caller",
+            "phone": record.phone or "unknown",
+            "situation": f"{situation}: {message}"
+        }
+        result = escalate_urgent_case.invoke(args, config=thread_config(session_id))
+        record.apply_tool_result(escalate_urgent_case.name, args, result)
+        metrics.count("shed_urgent_escalated")
+        return URGENT_REPLY, record.as_caller_info()
+
+    if not record.phone:
+        found = PHONE_NUMBER.search(message or "")
+        if found is None:
+            return ASK_FOR_NUMBER, record.as_caller_info()
+        record.phone = found.group()
+
+    urgent = record.urgency == "urgent"
+    args = {
+        "name": record.name or "Unknown caller",
+        "phone": record.phone,
+        "case_type": record.case_type or "unknown",
+        "notes": f"Callback requested while lines were busy. Caller said: {message}",
+        "email": record.email,
+        "urgency": "urgent" if urgent else "normal"
+    }
+    result = capture_lead.invoke(args, config=thread_config(session_id))
+    record.apply_tool_result("capture_lead", args, result)
+    metrics.count("shed_messages_taken")
+    reply = MESSAGE_TAKEN.format(phone=record.phone, when="as soon as possible" if urgent else "shortly")
+    return reply, record.as_caller_info()
@@ -1,24 +1,39 @@
 import os
+import uuid
+import asyncio
+import threading
 from dotenv import load_dotenv
-from langchain_aws import ChatBedrock
-from langchain_core.messages import HumanMessage, SystemMessage
-from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
 
+from agent import metrics, response_cache
 from agent.prompts import CLARA_SYSTEM_PROMPT
+from agent.context import build_context
+from agent.clients import get_client
 from agent.tools import ALL_TOOLS
-from agent.memory import AgentState, create_initial_state
+from agent.triage import triage_node, after_triage
+from agent.memory import AgentState, create_initial_state, record_tool_results
+from agent.checkpoints import (
+    get_checkpointer, thread_config, has_thread, ahas_thread, compact_thread, acompact_thread, end_thread
+)
 
 load_dotenv()
 
+# Spoken while tools run so voice TTS has something to say before the final
+# answer is ready. Set CLARA_TOOL_FILLER="" to stay silent instead.
+TOOL_FILLER = os.getenv("CLARA_TOOL_FILLER", "One moment.")
 
-def build_clara_agent():
 
-    llm = ChatBedrock(
-        model_id="us.anthropic.claude-sonnet-4-5-20250929-v1:0",
-        region_name="us-east-1",
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+MODEL_ID = "us.anthropic.claude-sonnet-4-5-20250929-v1:0"
+
+
+def build_bedrock_llm():
+    from langchain_aws import ChatBedrock
+
+    return ChatBedrock(
+        model_id=MODEL_ID,
+        client=get_client("bedrock-runtime"),
+        bedrock_client=get_client("bedrock"),
         model_kwargs={"temperature": 0.3, "max_tokens": 1024},
 
         guardrails={
@@ -28,15 +43,58 @@ def build_clara_agent():
     }
     )
 
+
+def build_clara_agent(llm=None):
+    """Compile Clara's graph. Pass ``llm`` to swap Bedrock for a stub model."""
+    from langgraph.graph import StateGraph, END
+    from langgraph.prebuilt import ToolNode
+
+    if llm is None:
+        llm = build_bedrock_llm()
+
     llm_with_tools = llm.bind_tools(ALL_TOOLS)
 
+    def agent_update(state: AgentState, response, context_updates: dict) -> dict:
+        metrics.record_tokens(response.usage_metadata)
+        response_cache.remember(state, CLARA_SYSTEM_PROMPT, response)
+        return {"messages": [response], **context_updates}
+
     def agent_node(state: AgentState) -> dict:
-        messages = [SystemMessage(content=CLARA_SYSTEM_PROMPT)] + state["messages"]
-        response = llm_with_tools.invoke(messages)
-        return {"messages": [response]}
+        cached = response_cache.lookup(state, CLARA_SYSTEM_PROMPT)
+        if cached is not None:
+            return {"messages": [cached]}
+        messages, context_updates = build_context(state, CLARA_SYSTEM_PROMPT)
+        with metrics.timer("llm"):
+            response = llm_with_tools.invoke(messages)
+        return agent_update(state, response, context_updates)
+
+    async def aagent_node(state: AgentState) -> dict:
+        # Awaited rather than run whole on an executor thread, so a cancelled
+        # turn stops reading the Bedrock stream at the next chunk.
+        cached = response_cache.lookup(state, CLARA_SYSTEM_PROMPT)
+        if cached is not None:
+            return {"messages": [cached]}
+        messages, context_updates = build_context(state, CLARA_SYSTEM_PROMPT)
+        with metrics.timer("llm"):
+            try:
+                response = await llm_with_tools.ainvoke(messages)
+            except asyncio.CancelledError:
+                metrics.count("llm_calls_cancelled")
+                raise
+        return agent_update(state, response, context_updates)
 
     tool_node = ToolNode(ALL_TOOLS)
 
+    def run_tools(state: AgentState, config):
+        with metrics.timer("tools"):
+            result = tool_node.invoke(state, config)
+        return {**result, **record_tool_results(state, result["messages"])}
+
+    async def arun_tools(state: AgentState, config):
+        with metrics.timer("tools"):
+            result = await tool_node.ainvoke(state, config)
+        return {**result, **record_tool_results(state, result["messages"])}
+
     def should_continue(state: AgentState) -> str:
         last_message = state["messages"][-1]
         if hasattr(last_message, "tool_calls") and last_message.tool_calls:
@@ -47,10 +105,20 @@ def build_clara_agent():
 
     workflow = StateGraph(AgentState)
 
-    workflow.add_node("agent", agent_node)
-    workflow.add_node("tools", tool_node)
+    workflow.add_node("triage", triage_node)
+    workflow.add_node("agent", RunnableLambda(agent_node, afunc=aagent_node))
+    workflow.add_node("tools", RunnableLambda(run_tools, afunc=arun_tools))
 
-    workflow.set_entry_point("agent")
+    workflow.set_entry_point("triage")
+
+    workflow.add_conditional_edges(
+        "triage",
+        after_triage,
+        {
+            "agent": "agent",
+            "done": END
+        }
+    )
 
     workflow.add_conditional_edges(
         "agent",
@@ -63,20 +131,242 @@ def build_clara_agent():
 
     workflow.add_edge("tools", "agent")
 
-    return workflow.compile()
+    return workflow.compile(checkpointer=get_checkpointer())
+
+
+# The graph is compiled on first use rather than at import, so importing
+# this module stays cheap. api.py calls get_clara() during startup to warm it.
+_clara = None
+_clara_lock = threading.Lock()
+
+
+def get_clara():
+    global _clara
+    if _clara is None:
+        with _clara_lock:
+            if _clara is None:
+                _clara = build_clara_agent()
+    return _clara
+
+
+def set_clara(graph):
+    """Install a prebuilt graph, e.g. one compiled around a stub model."""
+    global _clara
+    with _clara_lock:
+        _clara = graph
+
+
+def __getattr__(name):
+    if name == "clara":
+        return get_clara()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def turn_input(user_message: str, state: AgentState, thread_exists: bool = None):
+    """Graph input and config for one caller turn.
+
+    With a checkpointer the graph already holds the call's history, so only
+    the new message is sent; the full state is sent only to seed a new call.
+    Without one, the caller's state carries the whole conversation. The
+    config names the call either way so tools can key holds by it.
+    """
+    # The id lets interrupt_turn find where this turn starts in the thread.
+    message = HumanMessage(content=user_message, id=str(uuid.uuid4()))
+    session_id = state["session_id"]
+    config = thread_config(session_id)
+    if get_checkpointer() is None:
+        state["messages"].append(message)
+        return state, config
+
+    if thread_exists is None:
+        thread_exists = has_thread(session_id)
+    if thread_exists:
+        return {"messages": [message]}, config
+    return {**state, "messages": state["messages"] + [message]}, config
+
+
+async def aturn_input(user_message: str, state: AgentState):
+    """turn_input for the async paths, with the checkpoint lookup off the event loop."""
+    thread_exists = get_checkpointer() is not None and await ahas_thread(state["session_id"])
+    return turn_input(user_message, state, thread_exists)
 
 
-clara = build_clara_agent()
+def finish_turn(state: AgentState, result: dict):
+    state.update(result)
+    if get_checkpointer() is not None:
+        compact_thread(state["session_id"])
+    return state
+
+
+async def afinish_turn(state: AgentState, result: dict):
+    state.update(result)
+    if get_checkpointer() is not None:
+        await acompact_thread(state["session_id"])
+    return state
 
 
 def chat(user_message: str, state: AgentState):
-    state["messages"].append(HumanMessage(content=user_message))
-    result = clara.invoke(state)
-    last_message = result["messages"][-1]
-    return last_message.content, result
+    graph_input, config = turn_input(user_message, state)
+    result = get_clara().invoke(graph_input, config)
+    state = finish_turn(state, result)
+    return state["messages"][-1].content, state
+
+
+async def interrupt_turn(state: AgentState, graph_input: dict, config: dict, heard: str, last: dict = None):
+    """Leave the call's history as the caller experienced a cancelled turn.
+
+    The caller's message stays. Whatever the graph added after it (tool calls
+    whose results never came back, an answer nobody heard) is dropped, and
+    the part of the reply already spoken is kept, marked interrupted. Tool
+    outcomes that did land stay in ``caller_info``; without a checkpointer
+    they are taken from ``last``, the latest graph values the run produced.
+    """
+    partial = []
+    if heard:
+        partial.append(AIMessage(content=heard, response_metadata={"interrupted": True}))
+    if get_checkpointer() is None:
+        if last is not None:
+            state["caller_info"] = last.get("caller_info", state["caller_info"])
+            state["tools_called"] = last.get("tools_called", state["tools_called"])
+        state["messages"].extend(partial)
+        return state
+
+    # Messages only ever append, so fork the thread from the last checkpoint
+    # that ends with the caller's message instead of editing the newest one.
+    message = graph_input["messages"][-1]
+    graph = get_clara()
+    head = await graph.aget_state(config)
+    base = None
+    async for snapshot in graph.aget_state_history(config):
+        messages = snapshot.values.get("messages") or []
+        if messages and messages[-1].id == message.id:
+            base = snapshot
+            break
+
+    if base is None:
+        update = {**graph_input, "messages": graph_input["messages"] + partial}
+        base = head
+    else:
+        update = {
+            "messages": partial,
+            "caller_info": head.values["caller_info"],
+            "tools_called": head.values["tools_called"][len(base.values["tools_called"]):]
+        }
+    # As the agent node, so the thread ends the turn with nothing pending.
+    await graph.aupdate_state(base.config, update, as_node="agent")
+    await acompact_thread(state["session_id"])
+    return state
+
+
+async def answer_outside_graph(user_message: str, state: AgentState, answer):
+    """Answer a turn without running the graph, e.g. when it was shed.
+
+    ``answer(caller_info)`` returns the reply and the updated caller_info.
+    The exchange goes into the call's history like any other turn.
+    """
+    graph_input, config = await aturn_input(user_message, state)
+    if get_checkpointer() is None:
+        reply, state["caller_info"] = answer(state["caller_info"])
+        state["messages"].append(AIMessage(content=reply))
+        return reply, state
+
+    graph = get_clara()
+    snapshot = await graph.aget_state(config)
+    reply, caller_info = answer({**state["caller_info"], **snapshot.values.get("caller_info", {})})
+    update = {
+        **graph_input,
+        "messages": graph_input["messages"] + [AIMessage(content=reply)],
+        "caller_info": caller_info
+    }
+    await graph.aupdate_state(config, update, as_node="agent")
+    await acompact_thread(state["session_id"])
+    return reply, state
+
+
+async def achat(user_message: str, state: AgentState):
+    graph_input, config = await aturn_input(user_message, state)
+    result = await get_clara().ainvoke(graph_input, config)
+    state = await afinish_turn(state, result)
+    return state["messages"][-1].content, state
+
+
+def chunk_text(chunk) -> str:
+    content = chunk.content
+    if isinstance(content, str):
+        return content
+    return "".join(
+        block.get("text", "") for block in content
+        if isinstance(block, dict) and block.get("type") == "text"
+    )
+
+
+async def astream_chat(user_message: str, state: AgentState):
+    """Yield Clara's reply as text chunks while the graph runs.
+
+    Tokens from the agent node are passed through as Bedrock produces them;
+    tool-call phases yield TOOL_FILLER once instead. The final graph state
+    is written back into ``state`` when the run completes. If the run is
+    cancelled (the caller barged in), ``state`` and the thread keep only
+    what the caller heard; see interrupt_turn.
+    """
+    graph_input, config = await aturn_input(user_message, state)
+
+    result = None
+    spoken = False
+    step_spoken = False
+    step = None
+    heard = []
+
+    try:
+        async for mode, data in get_clara().astream(
+            graph_input, config, stream_mode=["messages", "values"]
+        ):
+            if mode == "values":
+                result = data
+                continue
+
+            chunk, metadata = data
+            if not isinstance(chunk, AIMessage):
+                continue
+            if metadata.get("langgraph_node") not in ("triage", "agent"):
+                continue
+
+            if metadata.get("langgraph_step") != step:
+                step = metadata.get("langgraph_step")
+                step_spoken = False
+
+            text = chunk_text(chunk)
+            if text:
+                if spoken and not step_spoken and not text[0].isspace():
+                    text = " " + text
+                spoken = step_spoken = True
+                heard.append(text)
+                yield text
+            elif getattr(chunk, "tool_call_chunks", None) and not step_spoken and TOOL_FILLER:
+                yield (" " if spoken else "") + TOOL_FILLER
+                spoken = step_spoken = True
+    except asyncio.CancelledError:
+        try:
+            await interrupt_turn(state, graph_input, config, "".join(heard).strip(), result)
+        except Exception as e:
+            print(f"\n⚠️  Could not tidy interrupted turn for {state['session_id']}: {e}")
+        raise
+
+    if result is not None:
+        await afinish_turn(state, result)
 
 
 def run_single_query(query: str) -> str:
-    state = create_initial_state(session_id="test-single")
-    response, _ = chat(query, state)
-    return response
\ No newline at end of file
+    return run_conversation([query])[-1]
+
+
+def run_conversation(turns: list[str]) -> list[str]:
+    state = create_initial_state(session_id=f"test-{uuid.uuid4().hex[:12]}")
+    responses = []
+    try:
+        for turn in turns:
+            response, state = chat(turn, state)
+            responses.append(response)
+    finally:
+        end_thread(state["session_id"])
+    return responses
\ No newline at end of file
@@ -0,0 +1,147 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Size-bounded LRU cache whose entries expire after ``ttl_seconds``."""
+
+    def __init__(self, maxsize: int = 256, ttl_seconds: float = 600):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SemanticCache:
+    """LRU cache looked up by embedding similarity instead of exact key.
+
+    Vectors sit in one preallocated matrix, so a lookup is a single
+    matrix-vector product over every entry. ``embed`` must return
+    L2-normalised NumPy vectors; a hit needs cosine similarity of at least
+    ``threshold``. Entries are tagged with a ``version`` and the whole cache
+    is dropped when a lookup arrives with a different one.
+    """
+
+    def __init__(self, embed, dim: int, maxsize: int = 256, ttl_seconds: float = 3600, threshold: float = 0.92):
+        import numpy as np
+
+        self.embed = embed
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._vectors = np.zeros((maxsize, dim), dtype=np.float32)
+        self._entries = OrderedDict()
+        self._free = list(range(maxsize))
+        self._lock = threading.Lock()
+
+    def _check_version(self, version):
+        if version != self.version:
+            self._clear()
+            self.version = version
+
+    def get(self, text: str, version=None, default=None):
+        query = self.embed(text)
+        with self._lock:
+            self._check_version(version)
+            if self._entries:
+                scores = self._vectors @ query
+                slot = int(scores.argmax())
+                entry = self._entries.get(slot)
+                if entry is not None and scores[slot] >= self.threshold:
+                    if time.monotonic() - entry[1] <= self.ttl_seconds:
+                        self._entries.move_to_end(slot)
+                        self.hits += 1
+                        return entry[0]
+                    self._evict(slot)
+            self.misses += 1
+            return default
+
+    def put(self, text: str, value, version=None) -> None:
+        vector = self.embed(text)
+        if not vector.any():
+            return
+        with self._lock:
+            self._check_version(version)
+            if self._entries:
+                slot = int((self._vectors @ vector).argmax())
+                if slot in self._entries and self._vectors[slot] @ vector >= 0.9999:
+                    self._evict(slot)
+            if not self._free:
+                self._evict(next(iter(self._entries)))
+            slot = self._free.pop()
+            self._vectors[slot] = vector
+            self._entries[slot] = (value, time.monotonic())
+
+    def _evict(self, slot: int):
+        del self._entries[slot]
+        self._vectors[slot] = 0.0
+        self._free.append(slot)
+
+    def _clear(self):
+        self._entries.clear()
+        self._vectors[:] = 0.0
+        self._free = list(range(self.maxsize))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,173 @@
+import os
+import time
+import asyncio
+import sqlite3
+import threading
+
+# Where the graph keeps each call's state between turns, keyed by the Vapi
+# call id:
+#   sqlite - file on disk; survives restarts and is shared by every worker
+#            and replica that mounts the same file
+#   memory - process-local, for tests and one-off scripts
+#   none   - no checkpointer; callers pass the whole AgentState every turn
+# Stateless mode (CLARA_STATELESS=1) rebuilds each call from the messages
+# Vapi sends, so there is nothing for a checkpointer to hold.
+CHECKPOINTER = "none" if os.getenv("CLARA_STATELESS", "0") == "1" else os.getenv("CLARA_CHECKPOINTER", "sqlite")
+CHECKPOINT_DB = os.getenv("CLARA_CHECKPOINT_DB", "clara_checkpoints.db")
+# Checkpoints kept per call after compaction, and how long an idle call's
+# checkpoints live before they are pruned.
+CHECKPOINTS_KEPT = int(os.getenv("CLARA_CHECKPOINTS_KEPT", "1"))
+CHECKPOINT_TTL = float(os.getenv("CLARA_CHECKPOINT_TTL", "86400"))
+PRUNE_EVERY = 200
+
+_checkpointer = None
+_lock = threading.Lock()
+
+
+def build_sqlite_saver(path: str):
+    from langgraph.checkpoint.sqlite import SqliteSaver
+
+    class ThreadedSqliteSaver(SqliteSaver):
+        """SqliteSaver with async methods run on worker threads.
+
+        The stock SqliteSaver is sync-only and AsyncSqliteSaver is async-only;
+        Clara drives the same graph from both (api.py streams, chat.py and the
+        evals invoke), so one saver has to serve both.
+        """
+
+        def __init__(self, conn):
+            super().__init__(conn)
+            self._compactions = 0
+
+        def setup(self):
+            if self.is_setup:
+                return
+            super().setup()
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS thread_activity ("
+                " thread_id TEXT PRIMARY KEY,"
+                " updated_at REAL NOT NULL)"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS thread_activity_updated_at"
+                " ON thread_activity (updated_at)"
+            )
+            self.conn.commit()
+
+        def put(self, config, checkpoint, metadata, new_versions):
+            next_config = super().put(config, checkpoint, metadata, new_versions)
+            with self.cursor() as cur:
+                cur.execute(
+                    "INSERT INTO thread_activity (thread_id, updated_at) VALUES (?, ?) "
+                    "ON CONFLICT(thread_id) DO UPDATE SET updated_at = excluded.updated_at",
+                    (str(config["configurable"]["thread_id"]), time.time())
+                )
+            return next_config
+
+        def delete_thread(self, thread_id):
+            super().delete_thread(thread_id)
+            with self.cursor() as cur:
+                cur.execute("DELETE FROM thread_activity WHERE thread_id = ?", (str(thread_id),))
+
+        def compact_thread(self, thread_id, keep: int = CHECKPOINTS_KEPT):
+            """Drop all but the newest ``keep`` checkpoints of a call."""
+            thread_id = str(thread_id)
+            with self.cursor() as cur:
+                newest = (
+                    "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? "
+                    "ORDER BY checkpoint_id DESC LIMIT ?"
+                )
+                cur.execute(
+                    f"DELETE FROM writes WHERE thread_id = ? AND checkpoint_id NOT IN ({newest})",
+                    (thread_id, thread_id, keep)
+                )
+                cur.execute(
+                    f"DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_id NOT IN ({newest})",
+                    (thread_id, thread_id, keep)
+                )
+            self._compactions += 1
+            if self._compactions % PRUNE_EVERY == 0:
+                self.prune_idle()
+
+        def prune_idle(self, ttl_seconds: float = CHECKPOINT_TTL):
+            """Delete every call that has not taken a turn in ``ttl_seconds``."""
+            cutoff = time.time() - ttl_seconds
+            with self.cursor() as cur:
+                idle = "SELECT thread_id FROM thread_activity WHERE updated_at < ?"
+                cur.execute(f"DELETE FROM writes WHERE thread_id IN ({idle})", (cutoff,))
+                cur.execute(f"DELETE FROM checkpoints WHERE thread_id IN ({idle})", (cutoff,))
+                cur.execute("DELETE FROM thread_activity WHERE updated_at < ?", (cutoff,))
+
+        async def aget_tuple(self, config):
+            return await asyncio.to_thread(self.get_tuple, config)
+
+        async def alist(self, config, *, filter=None, before=None, limit=None):
+            items = await asyncio.to_thread(
+                lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+            )
+            for item in items:
+                yield item
+
+        async def aput(self, config, checkpoint, metadata, new_versions):
+            return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+        async def aput_writes(self, config, writes, task_id, task_path=""):
+            return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+        async def adelete_thread(self, thread_id):
+            return await asyncio.to_thread(self.delete_thread, thread_id)
+
+        async def acompact_thread(self, thread_id, keep: int = CHECKPOINTS_KEPT):
+            return await asyncio.to_thread(self.compact_thread, thread_id, keep)
+
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return ThreadedSqliteSaver(conn)
+
+
+def get_checkpointer():
+    global _checkpointer
+    if CHECKPOINTER == "none":
+        return None
+    if _checkpointer is None:
+        with _lock:
+            if _checkpointer is None:
+                if CHECKPOINTER == "sqlite":
+                    _checkpointer = build_sqlite_saver(CHECKPOINT_DB)
+                elif CHECKPOINTER == "memory":
+                    from langgraph.checkpoint.memory import InMemorySaver
+                    _checkpointer = InMemorySaver()
+                else:
+                    raise ValueError(f"Unknown CLARA_CHECKPOINTER: {CHECKPOINTER}")
+    return _checkpointer
+
+
+def thread_config(session_id: str) -> dict:
+    return {"configurable": {"thread_id": session_id}}
+
+
+def has_thread(session_id: str) -> bool:
+    return get_checkpointer().get_tuple(thread_config(session_id)) is not None
+
+
+async def ahas_thread(session_id: str) -> bool:
+    return await get_checkpointer().aget_tuple(thread_config(session_id)) is not None
+
+
+def compact_thread(session_id: str):
+    saver = get_checkpointer()
+    if hasattr(saver, "compact_thread"):
+        saver.compact_thread(session_id)
+
+
+async def acompact_thread(session_id: str):
+    """compact_thread (and any idle-call pruning it triggers) on a worker thread."""
+    saver = get_checkpointer()
+    if hasattr(saver, "acompact_thread"):
+        await saver.acompact_thread(session_id)
+
+
+def end_thread(session_id: str):
+    saver = get_checkpointer()
+    if saver is not None:
+        saver.delete_thread(session_id)
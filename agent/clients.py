@@ -0,0 +1,66 @@
+import os
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# One boto3 session and one client per service for the whole process. boto3
+# clients are thread-safe, so every turn shares the same connection pool
+# instead of re-resolving credentials and re-handshaking TLS per call.
+_session = None
+_clients = {}
+_lock = threading.Lock()
+
+
+def aws_region() -> str:
+    return os.getenv("BEDROCK_REGION", "us-east-1")
+
+
+def client_config():
+    from botocore.config import Config
+
+    return Config(
+        region_name=aws_region(),
+        max_pool_connections=int(os.getenv("CLARA_AWS_MAX_POOL", "50")),
+        tcp_keepalive=True,
+        connect_timeout=float(os.getenv("CLARA_AWS_CONNECT_TIMEOUT", "2")),
+        read_timeout=float(os.getenv("CLARA_AWS_READ_TIMEOUT", "30")),
+        retries={
+            "max_attempts": int(os.getenv("CLARA_AWS_MAX_ATTEMPTS", "3")),
+            "mode": os.getenv("CLARA_AWS_RETRY_MODE", "adaptive")
+        }
+    )
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                import boto3
+
+                _session = boto3.Session(
+                    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+                    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+                    region_name=aws_region()
+                )
+    return _session
+
+
+def get_client(service: str):
+    client = _clients.get(service)
+    if client is None:
+        session = get_session()
+        with _lock:
+            client = _clients.get(service)
+            if client is None:
+                client = session.client(service, config=client_config())
+                _clients[service] = client
+    return client
+
+
+def warm_clients():
+    """Build the shared clients and resolve credentials ahead of the first call."""
+    get_session().get_credentials()
+    for service in ("bedrock-runtime", "bedrock", "bedrock-agent-runtime"):
+        get_client(service)
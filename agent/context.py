@@ -0,0 +1,123 @@
+import os
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from agent.memory import CallRecord
+
+# How many caller turns are replayed verbatim to the model. Anything older is
+# folded into a short running summary so the prompt stays the same size no
+# matter how long the call runs.
+CONTEXT_TURNS = int(os.getenv("CLARA_CONTEXT_TURNS", "6"))
+SUMMARY_MAX_CHARS = int(os.getenv("CLARA_SUMMARY_MAX_CHARS", "1200"))
+SNIPPET_CHARS = 160
+# Mark the system prompt (and, ahead of it, the tool schemas) as a Bedrock
+# prompt-cache prefix. Everything that changes during a call goes in a second
+# block after the cache point so the prefix stays byte-identical.
+PROMPT_CACHE = os.getenv("CLARA_PROMPT_CACHE", "1") == "1"
+
+
+def _text(message) -> str:
+    content = message.content
+    if isinstance(content, list):
+        content = " ".join(
+            block.get("text", "") for block in content
+            if isinstance(block, dict) and block.get("type") == "text"
+        )
+    content = " ".join(str(content).split())
+    if len(content) > SNIPPET_CHARS:
+        content = content[:SNIPPET_CHARS - 3] + "..."
+    return content
+
+
+def summarize_messages(messages) -> list[str]:
+    lines = []
+    for message in messages:
+        if isinstance(message, HumanMessage):
+            lines.append(f"Caller: {_text(message)}")
+        elif isinstance(message, AIMessage):
+            for call in message.tool_calls or []:
+                lines.append(f"Clara used {call['name']}")
+            text = _text(message)
+            if text:
+                lines.append(f"Clara: {text}")
+        elif isinstance(message, ToolMessage):
+            lines.append(f"{message.name or 'tool'} result: {_text(message)}")
+    return lines
+
+
+def fold_summary(summary: str, messages) -> str:
+    lines = ([summary] if summary else []) + summarize_messages(messages)
+    folded = "\n".join(lines)
+    if len(folded) > SUMMARY_MAX_CHARS:
+        folded = "..." + folded[-(SUMMARY_MAX_CHARS - 3):]
+    return folded
+
+
+def window_start(messages, turns: int = CONTEXT_TURNS) -> int:
+    """Index of the first message to send verbatim.
+
+    The window always opens on a caller message so a tool call is never
+    separated from its result.
+    """
+    starts = [i for i, m in enumerate(messages) if isinstance(m, HumanMessage)]
+    if len(starts) <= turns:
+        return 0
+    return starts[-turns]
+
+
+def pinned_caller_info(caller_info: dict) -> str:
+    """Render the call record so the model need not re-read old turns for it."""
+    record = CallRecord.from_caller_info(caller_info)
+    lines = [
+        f"- {label}: {getattr(record, field)}"
+        for field, label in (
+            ("name", "name"), ("phone", "phone"), ("email", "email"),
+            ("case_type", "case type"), ("preferred_time", "preferred time")
+        )
+        if getattr(record, field)
+    ]
+    if record.urgency == "urgent":
+        lines.append("- urgent: yes, already escalated to the on-call attorney")
+    if record.lead_captured:
+        lines.append(f"- lead saved: {record.lead_id or 'yes'} (do not capture it again)")
+    if record.consultation_booked:
+        booking = " ".join(filter(None, (record.confirmation_id, record.attorney)))
+        lines.append(f"- consultation booked: {booking or 'yes'} (do not book again)")
+    if not lines:
+        return ""
+    return "## CALLER DETAILS ALREADY COLLECTED\n" + "\n".join(lines)
+
+
+def build_context(state, system_prompt: str):
+    """Return the messages for one LLM call and the state updates it implies.
+
+    Turns that slid out of the window since the last call are folded into
+    ``state["summary"]``; the caller details are pinned in the system prompt
+    rather than re-derived from old turns.
+    """
+    messages = state["messages"]
+    summary = state.get("summary", "")
+    summarized_upto = state.get("summarized_upto", 0)
+
+    start = window_start(messages)
+    updates = {}
+    if start > summarized_upto:
+        summary = fold_summary(summary, messages[summarized_upto:start])
+        updates = {"summary": summary, "summarized_upto": start}
+
+    sections = []
+    pinned = pinned_caller_info(state.get("caller_info"))
+    if pinned:
+        sections.append(pinned)
+    if summary:
+        sections.append("## EARLIER IN THIS CALL\n" + summary)
+
+    return [system_message(system_prompt, sections)] + messages[start:], updates
+
+
+def system_message(system_prompt: str, sections: list[str]) -> SystemMessage:
+    if not PROMPT_CACHE:
+        return SystemMessage(content="\n\n".join([system_prompt] + sections))
+    blocks = [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+    if sections:
+        blocks.append({"type": "text", "text": "\n\n".join(sections)})
+    return SystemMessage(content=blocks)
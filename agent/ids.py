@@ -0,0 +1,68 @@
+import os
+import time
+import itertools
+
+# ULID-style ids for leads, bookings and alerts: 128 bits written as 26
+# Crockford base32 characters, so they sort by creation time as strings.
+#
+#   48 bits  milliseconds since the epoch
+#   32 bits  node, random per process, so replicas and workers never share
+#            a space; with CLARA_NODE_ID set, its low 16 bits are the top half
+#            and every process still draws the bottom half at random
+#   48 bits  sequence from itertools.count, which hands out each value once
+#            without a lock, starting at a random offset
+#
+# Ids are unique across processes and sort by millisecond; ids from one
+# thread are strictly increasing.
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+SEQUENCE_BITS = 48
+NODE_BITS = 32
+PROCESS_BITS = 16
+
+_node = 0
+_sequence = None
+_last_ms = 0
+
+
+def _seed():
+    """Pick this process's node and sequence start; re-run in forked workers."""
+    global _node, _sequence
+    node = int.from_bytes(os.urandom(4), "big")
+    configured = os.getenv("CLARA_NODE_ID")
+    if configured is not None:
+        # Spawned workers (uvicorn --workers) all see the same setting.
+        process = node & ((1 << PROCESS_BITS) - 1)
+        node = (int(configured) << PROCESS_BITS) | process
+    _node = node & ((1 << NODE_BITS) - 1)
+    _sequence = itertools.count(int.from_bytes(os.urandom(4), "big"))
+
+
+_seed()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_seed)
+
+
+def encode(value: int) -> str:
+    chars = []
+    for _ in range(26):
+        chars.append(ALPHABET[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+def new_id(prefix: str = "") -> str:
+    global _last_ms
+    # Never step back if the wall clock does; the sequence keeps ids
+    # distinct within the same millisecond.
+    ms = _last_ms = max(time.time_ns() // 1_000_000, _last_ms)
+    sequence = next(_sequence) & ((1 << SEQUENCE_BITS) - 1)
+    value = (ms << (NODE_BITS + SEQUENCE_BITS)) | (_node << SEQUENCE_BITS) | sequence
+    return f"{prefix}-{encode(value)}" if prefix else encode(value)
+
+
+def id_time(identifier: str) -> float:
+    """Creation time (epoch seconds) of an id from new_id."""
+    value = 0
+    for char in identifier.rsplit("-", 1)[-1]:
+        value = (value << 5) | ALPHABET.index(char)
+    return (value >> (NODE_BITS + SEQUENCE_BITS)) / 1000
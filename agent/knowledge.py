@@ -0,0 +1,202 @@
+import os
+import re
+import math
+import zlib
+import threading
+from collections import Counter
+from pathlib import Path
+
+from agent import metrics
+from agent.cache import TTLCache
+from agent.clients import get_client
+
+# Where search_firm_knowledge looks things up:
+#   remote      - Bedrock Knowledge Base only
+#   local       - in-process index over Knowledge-base/ only (works offline)
+#   local-first - local index, falling back to Bedrock when nothing scores well
+RETRIEVAL_MODE = os.getenv("CLARA_RETRIEVAL_MODE", "remote")
+KB_DIR = Path(os.getenv(
+    "CLARA_KB_DIR",
+    Path(__file__).resolve().parent.parent / "Knowledge-base"
+))
+LOCAL_TOP_K = int(os.getenv("CLARA_LOCAL_TOP_K", "3"))
+LOCAL_MIN_SCORE = float(os.getenv("CLARA_LOCAL_MIN_SCORE", "1.0"))
+USE_EMBEDDINGS = os.getenv("CLARA_KB_EMBEDDINGS", "0") == "1"
+EMBEDDING_DIM = 512
+
+# Callers ask the same few questions all day; repeated lookups are answered
+# from here without touching the index or the network.
+retrieval_cache = TTLCache(
+    maxsize=int(os.getenv("CLARA_RETRIEVAL_CACHE_SIZE", "512")),
+    ttl_seconds=float(os.getenv("CLARA_RETRIEVAL_CACHE_TTL", "3600"))
+)
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for",
+    "from", "have", "how", "i", "if", "in", "is", "it", "me", "my", "of", "on",
+    "or", "our", "the", "to", "we", "what", "when", "where", "who",
+    "with", "you", "your"
+}
+TOKEN_RE = re.compile(r"[a-z0-9$]+")
+
+
+def tokenize(text: str) -> list[str]:
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def embed(text: str):
+    """Hashed bag-of-words vector, L2-normalised. Needs NumPy."""
+    import numpy as np
+
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for token in tokenize(text):
+        vector[zlib.crc32(token.encode()) % EMBEDDING_DIM] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def load_chunks(kb_dir: Path = KB_DIR) -> list[dict]:
+    chunks = []
+    for path in sorted(kb_dir.glob("*.txt")):
+        paragraphs = [p.strip() for p in path.read_text(encoding="utf-8").split("\n\n")]
+        # The first paragraph of every file is just its title.
+        for paragraph in paragraphs[1:]:
+            if paragraph:
+                chunks.append({"source": path.name, "text": paragraph})
+    return chunks
+
+
+class LocalIndex:
+    """BM25 over Knowledge-base/ paragraphs, optionally blended with embeddings."""
+
+    def __init__(self, chunks: list[dict], k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.doc_lengths = []
+        for doc_id, chunk in enumerate(chunks):
+            counts = Counter(tokenize(chunk["text"]))
+            self.doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings.setdefault(term, []).append((doc_id, tf))
+        self.avg_length = sum(self.doc_lengths) / len(chunks) if chunks else 0.0
+        self.idf = {
+            term: math.log(1 + (len(chunks) - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+        self.vectors = None
+        if USE_EMBEDDINGS and chunks:
+            try:
+                import numpy as np
+            except ImportError:
+                np = None
+            if np is not None:
+                self.vectors = np.stack([embed(chunk["text"]) for chunk in chunks])
+
+    def search(self, query: str, top_k: int = LOCAL_TOP_K) -> list[tuple[float, dict]]:
+        scores = {}
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, tf in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / self.avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        if self.vectors is not None and scores:
+            similarity = self.vectors @ embed(query)
+            best = max(scores.values())
+            for doc_id in scores:
+                scores[doc_id] = scores[doc_id] + best * float(similarity[doc_id])
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [(score, self.chunks[doc_id]) for doc_id, score in ranked]
+
+
+_index = None
+_index_lock = threading.Lock()
+_kb_generation = 0
+
+
+def kb_version() -> str:
+    """Changes whenever the knowledge base may have: a resync, or an edit under KB_DIR."""
+    files = []
+    for path in sorted(KB_DIR.glob("*.txt")):
+        stat = path.stat()
+        files.append((path.name, stat.st_mtime_ns, stat.st_size))
+    return f"{_kb_generation}:{zlib.crc32(repr(files).encode())}"
+
+
+def get_index() -> LocalIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = LocalIndex(load_chunks())
+    return _index
+
+
+def warm_index():
+    if RETRIEVAL_MODE != "remote":
+        get_index()
+
+
+def search_local(query: str) -> list[str]:
+    with metrics.timer("retrieval.local"):
+        return [
+            chunk["text"] for score, chunk in get_index().search(query)
+            if score >= LOCAL_MIN_SCORE
+        ]
+
+
+def search_remote(query: str) -> list[str]:
+    with metrics.timer("retrieval.bedrock"):
+        response = get_client("bedrock-agent-runtime").retrieve(
+            knowledgeBaseId=os.getenv("BEDROCK_KNOWLEDGE_BASE_ID"),
+            retrievalQuery={"text": query},
+            retrievalConfiguration={
+                "vectorSearchConfiguration": {"numberOfResults": 3}
+            }
+        )
+    return [r["content"]["text"] for r in response.get("retrievalResults", [])]
+
+
+def cache_key(query: str) -> str:
+    """Order-free content words, so "What are your fees?" matches "what are the fees"."""
+    return " ".join(sorted(set(tokenize(query)))) or query.strip().lower()
+
+
+def retrieve(query: str) -> list[str]:
+    key = cache_key(query)
+    results = retrieval_cache.get(key)
+    metrics.record_cache("retrieval", results is not None)
+    if results is not None:
+        return results
+
+    if RETRIEVAL_MODE == "remote":
+        results = search_remote(query)
+    else:
+        results = search_local(query)
+        if not results and RETRIEVAL_MODE != "local":
+            results = search_remote(query)
+
+    retrieval_cache.put(key, results)
+    return results
+
+
+def resync_knowledge_base():
+    """Call after the Bedrock KB ingestion job or Knowledge-base/ files change."""
+    global _index, _kb_generation
+    with _index_lock:
+        _index = None
+        _kb_generation += 1
+    retrieval_cache.clear()
+    warm_index()
@@ -1,6 +1,14 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, fields
 from typing import TypedDict, Annotated
 import operator
-from langchain_core.messages import BaseMessage
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage, messages_from_dict, messages_to_dict
 
 class CallerInfo(TypedDict, total=False):
     name:str
@@ -8,28 +16,267 @@ class CallerInfo(TypedDict, total=False):
     email:str
     case_type:str
     urgency: str
-    consultantion_booked: bool 
-    lead_captured: bool 
-    preferred_time: str 
+    consultation_booked: bool
+    lead_captured: bool
+    preferred_time: str
+    lead_id: str
+    confirmation_id: str
+    attorney: str
 
 class AgentState(TypedDict):
     messages: Annotated[list[BaseMessage],operator.add]
-    session:str 
-    caller_info: CallerInfo 
+    session_id: str
+    call_start_time: str
+    caller_info: CallerInfo
     tools_called: Annotated[list[str], operator.add]
+    summary: str
+    summarized_upto: int
 
-def create_initial_state(session_id:str)-> AgentState: 
-    from datetime import datetime 
+def create_initial_state(session_id:str)-> AgentState:
+    from datetime import datetime
     return {
         "messages":[],
         "session_id": session_id,
-        "caller_info":{
-            "consultation_booked":False,
-            "lead_captured": False,
-            "urgency": "normal"
-
-        },
+        "caller_info": CallRecord().as_caller_info(),
         "call_start_time":datetime.now().isoformat(),
-        "tools_called":[] 
+        "tools_called":[],
+        "summary": "",
+        "summarized_upto": 0
+
+    }
+
+
+@dataclass(slots=True)
+class CallRecord:
+    """What Clara knows about the caller, updated as tool results come back.
+
+    State keeps the plain ``CallerInfo`` dict so it round-trips through the
+    session store and checkpointer; this is the typed view used to update
+    and read it.
+    """
+    name: str = ""
+    phone: str = ""
+    email: str = ""
+    case_type: str = ""
+    urgency: str = "normal"
+    preferred_time: str = ""
+    consultation_booked: bool = False
+    lead_captured: bool = False
+    lead_id: str = ""
+    confirmation_id: str = ""
+    attorney: str = ""
+
+    @classmethod
+    def from_caller_info(cls, caller_info) -> "CallRecord":
+        caller_info = caller_info or {}
+        return cls(**{f.name: caller_info[f.name] for f in fields(cls) if f.name in caller_info})
+
+    def as_caller_info(self) -> CallerInfo:
+        """Fields that are set, plus the three status flags."""
+        return {
+            f.name: getattr(self, f.name) for f in fields(self)
+            if getattr(self, f.name) or f.name in ("urgency", "consultation_booked", "lead_captured")
+        }
+
+    def fill(self, **values):
+        """Set fields the caller gave us without overwriting known ones with blanks."""
+        for key, value in values.items():
+            if value and not str(value).lower().startswith("unknown"):
+                setattr(self, key, value)
+
+    def apply_tool_result(self, name: str, args: dict, content) -> None:
+        try:
+            result = json.loads(content)
+        except (TypeError, ValueError):
+            return
+        if not isinstance(result, dict):
+            return
+        status = result.get("status")
+
+        if name == "book_consultation" and status == "confirmed":
+            self.fill(
+                name=args.get("caller_name"),
+                phone=args.get("phone"),
+                email=args.get("email"),
+                case_type=args.get("practice_area"),
+                preferred_time=result.get("scheduled_time") or args.get("preferred_time"),
+                confirmation_id=result.get("confirmation_id"),
+                attorney=result.get("attorney")
+            )
+            self.consultation_booked = True
+        elif name == "capture_lead" and status == "saved":
+            self.fill(
+                name=args.get("name"),
+                phone=args.get("phone"),
+                email=args.get("email"),
+                case_type=args.get("case_type"),
+                lead_id=result.get("lead_id")
+            )
+            if args.get("urgency") == "urgent":
+                self.urgency = "urgent"
+            self.lead_captured = True
+        elif name == "escalate_urgent_case" and status == "escalated":
+            self.fill(name=args.get("caller_name"), phone=args.get("phone"))
+            self.urgency = "urgent"
+
+
+def record_tool_results(state: AgentState, tool_messages) -> dict:
+    """State updates for one tools step: caller details and tools called."""
+    calls = {}
+    for message in reversed(state["messages"]):
+        if isinstance(message, AIMessage):
+            calls = {call["id"]: call for call in message.tool_calls or []}
+            break
+
+    record = CallRecord.from_caller_info(state.get("caller_info"))
+    names = []
+    for message in tool_messages:
+        if not isinstance(message, ToolMessage):
+            continue
+        call = calls.get(message.tool_call_id, {})
+        name = message.name or call.get("name", "")
+        names.append(name)
+        record.apply_tool_result(name, call.get("args", {}), message.content)
+    return {"caller_info": record.as_caller_info(), "tools_called": names}
+
+class SessionStore(ABC):
+    """Where api.py keeps each call's AgentState between turns."""
+
+    @abstractmethod
+    def get(self, session_id: str):
+        ...
+
+    @abstractmethod
+    def put(self, session_id: str, state: AgentState) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        ...
+
+
+class InMemorySessionStore(SessionStore):
+    """LRU + TTL store local to one worker process."""
+
+    def __init__(self, max_sessions: int = 1000, ttl_seconds: float = 3600):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            state, touched = entry
+            if time.monotonic() - touched > self.ttl_seconds:
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            return state
+
+    def put(self, session_id: str, state: AgentState) -> None:
+        with self._lock:
+            self._sessions[session_id] = (state, time.monotonic())
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SQLiteSessionStore(SessionStore):
+    """File-backed store shared by every worker on the host."""
+
+    def __init__(self, path: str = "clara_sessions.db", ttl_seconds: float = 3600):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY,"
+            " state TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id: str):
+        row = self._conn().execute(
+            "SELECT state FROM sessions WHERE session_id = ? AND updated_at > ?",
+            (session_id, time.time() - self.ttl_seconds)
+        ).fetchone()
+        if row is None:
+            return None
+        return state_from_json(row[0])
+
+    def put(self, session_id: str, state: AgentState) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO sessions (session_id, state, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET state = excluded.state, "
+                "updated_at = excluded.updated_at",
+                (session_id, state_to_json(state), time.time())
+            )
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self.prune()
+
+    def delete(self, session_id: str) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def prune(self) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "DELETE FROM sessions WHERE updated_at <= ?",
+                (time.time() - self.ttl_seconds,)
+            )
+
+
+def state_to_json(state: AgentState) -> str:
+    record = dict(state)
+    record["messages"] = messages_to_dict(state["messages"])
+    return json.dumps(record)
+
+
+def state_from_json(data: str) -> AgentState:
+    record = json.loads(data)
+    record["messages"] = messages_from_dict(record["messages"])
+    return record
+
 
-    }
\ No newline at end of file
+def get_session_store() -> SessionStore:
+    backend = os.getenv("CLARA_SESSION_STORE", "memory")
+    ttl = float(os.getenv("CLARA_SESSION_TTL", "3600"))
+    if backend == "sqlite":
+        return SQLiteSessionStore(
+            path=os.getenv("CLARA_SESSION_DB", "clara_sessions.db"),
+            ttl_seconds=ttl
+        )
+    if backend == "memory":
+        return InMemorySessionStore(
+            max_sessions=int(os.getenv("CLARA_SESSION_MAX", "1000")),
+            ttl_seconds=ttl
+        )
+    raise ValueError(f"Unknown CLARA_SESSION_STORE: {backend}")
@@ -0,0 +1,174 @@
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Latency buckets in seconds, shared by every stage histogram.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+MAX_TRACKED_SESSIONS = 1000
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += value
+        self.count += 1
+
+
+class TurnTrace:
+    """Timings for one caller turn, collected as the graph runs."""
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.started = time.perf_counter()
+        self.spans = []
+        self.tokens = {"input": 0, "output": 0, "cache_read": 0, "cache_write": 0}
+        self.cache = {}
+
+    def as_dict(self) -> dict:
+        return {
+            "session_id": self.session_id,
+            "total_seconds": round(time.perf_counter() - self.started, 4),
+            "spans": self.spans,
+            "tokens": self.tokens,
+            "cache": self.cache
+        }
+
+
+_lock = threading.Lock()
+_stages = {}
+_counters = {}
+_gauges = {}
+_sessions = OrderedDict()
+_current = ContextVar("clara_turn_trace", default=None)
+
+
+def observe(stage: str, seconds: float, **fields):
+    with _lock:
+        _stages.setdefault(stage, Histogram()).observe(seconds)
+    trace = _current.get()
+    if trace is not None:
+        trace.spans.append({"stage": stage, "seconds": round(seconds, 4), **fields})
+
+
+def count(name: str, amount: int = 1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def set_gauge(name: str, value: float):
+    with _lock:
+        _gauges[name] = value
+
+
+def record_cache(cache: str, hit: bool):
+    count(f"{cache}_cache_{'hits' if hit else 'misses'}")
+    trace = _current.get()
+    if trace is not None:
+        stats = trace.cache.setdefault(cache, {"hits": 0, "misses": 0})
+        stats["hits" if hit else "misses"] += 1
+
+
+def record_tokens(usage: dict):
+    if not usage:
+        return
+    details = usage.get("input_token_details") or {}
+    tokens = {
+        "input": usage.get("input_tokens", 0),
+        "output": usage.get("output_tokens", 0),
+        "cache_read": details.get("cache_read") or 0,
+        "cache_write": details.get("cache_creation") or 0
+    }
+    for kind, amount in tokens.items():
+        count(f"llm_{kind}_tokens", amount)
+    trace = _current.get()
+    if trace is not None:
+        for kind, amount in tokens.items():
+            trace.tokens[kind] += amount
+
+
+@contextmanager
+def timer(stage: str, **fields):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - started, **fields)
+
+
+@contextmanager
+def turn(session_id: str):
+    """Collect every stage timed inside this block into one TurnTrace."""
+    trace = TurnTrace(session_id)
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+        seconds = time.perf_counter() - trace.started
+        observe("turn", seconds)
+        with _lock:
+            session = _sessions.pop(session_id, None) or {
+                "turns": 0, "seconds": 0.0, "input_tokens": 0, "output_tokens": 0,
+                "cache_read_tokens": 0, "cache_write_tokens": 0
+            }
+            session["turns"] += 1
+            session["seconds"] += seconds
+            for kind, amount in trace.tokens.items():
+                session[f"{kind}_tokens"] += amount
+            _sessions[session_id] = session
+            while len(_sessions) > MAX_TRACKED_SESSIONS:
+                _sessions.popitem(last=False)
+
+
+def snapshot() -> dict:
+    with _lock:
+        return {
+            "stages": {
+                stage: {
+                    "count": h.count,
+                    "sum_seconds": h.total,
+                    "buckets": dict(zip([str(b) for b in BUCKETS] + ["+Inf"], h.counts))
+                }
+                for stage, h in _stages.items()
+            },
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "sessions": {sid: dict(s) for sid, s in _sessions.items()}
+        }
+
+
+def prometheus_text() -> str:
+    lines = [
+        "# HELP clara_stage_seconds Wall time per pipeline stage.",
+        "# TYPE clara_stage_seconds histogram"
+    ]
+    with _lock:
+        for stage, h in sorted(_stages.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS, h.counts):
+                cumulative += bucket_count
+                lines.append(f'clara_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'clara_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {h.count}')
+            lines.append(f'clara_stage_seconds_sum{{stage="{stage}"}} {h.total}')
+            lines.append(f'clara_stage_seconds_count{{stage="{stage}"}} {h.count}')
+        for name, value in sorted(_counters.items()):
+            lines.append(f"# TYPE clara_{name}_total counter")
+            lines.append(f"clara_{name}_total {value}")
+        for name, value in sorted(_gauges.items()):
+            lines.append(f"# TYPE clara_{name} gauge")
+            lines.append(f"clara_{name} {value}")
+        lines.append("# TYPE clara_tracked_sessions gauge")
+        lines.append(f"clara_tracked_sessions {len(_sessions)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,135 @@
+import os
+import re
+import zlib
+import threading
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from agent import metrics
+from agent.cache import SemanticCache
+from agent.knowledge import EMBEDDING_DIM, embed, kb_version
+from agent.memory import CallRecord
+from agent.tools import KB_ANSWER_PREFIX
+
+# Answers to opening questions that don't depend on who is calling ("what are
+# your hours", "how much for a will"). Only a call's first turn is looked up,
+# only answers built on nothing but successful knowledge-base lookups are
+# stored, and a turn that carries personal details (a name, digits, an email)
+# is neither looked up nor stored: the embedding is a bag of words, so "I'm
+# John, ..." and "I'm Maria, ..." would otherwise land on the same entry.
+# Built on first use; needs NumPy, and without it the cache stays off.
+ENABLED = os.getenv("CLARA_RESPONSE_CACHE", "1") == "1"
+THRESHOLD = float(os.getenv("CLARA_RESPONSE_CACHE_THRESHOLD", "0.97"))
+READ_ONLY_TOOLS = {"search_firm_knowledge"}
+INTRODUCTION = re.compile(
+    r"\b(?:my name is|my name's|name is|this is|call me|speaking|my (?:phone |cell )?number|my email|my address)\b",
+    re.IGNORECASE
+)
+DIGITS_OR_EMAIL = re.compile(r"\d|@|\bat\s+\w+\s+dot\s+\w+", re.IGNORECASE)
+CAPITALIZED = re.compile(r"\b[A-Z][a-z]+")
+SENTENCE_END = re.compile(r"[.!?]+\s*")
+
+_response_cache = None
+_built = False
+_lock = threading.Lock()
+
+
+def get_response_cache():
+    global _response_cache, _built
+    if not ENABLED:
+        return None
+    if not _built:
+        with _lock:
+            if not _built:
+                try:
+                    _response_cache = SemanticCache(
+                        embed,
+                        dim=EMBEDDING_DIM,
+                        maxsize=int(os.getenv("CLARA_RESPONSE_CACHE_SIZE", "256")),
+                        ttl_seconds=float(os.getenv("CLARA_RESPONSE_CACHE_TTL", "3600")),
+                        threshold=THRESHOLD
+                    )
+                except ImportError:
+                    _response_cache = None
+                _built = True
+    return _response_cache
+
+
+def stats():
+    """The cache's stats, or None if it is off or nothing has used it yet."""
+    return _response_cache.stats() if _response_cache is not None else None
+
+
+def cache_version(system_prompt: str) -> str:
+    return f"{zlib.crc32(system_prompt.encode())}:{kb_version()}"
+
+
+def anonymous(state) -> bool:
+    """No caller details beyond the number Vapi dialled in from."""
+    record = CallRecord.from_caller_info(state.get("caller_info"))
+    return (
+        not (record.name or record.email or record.case_type or record.preferred_time)
+        and record.urgency == "normal"
+        and not (record.lead_captured or record.consultation_booked)
+        and not state.get("summary")
+    )
+
+
+def personal(text: str) -> bool:
+    """Whether ``text`` may name or identify someone: digits, an email, a
+    self-introduction, or a capitalised word that doesn't open a sentence."""
+    if DIGITS_OR_EMAIL.search(text) or INTRODUCTION.search(text):
+        return True
+    return any(CAPITALIZED.search(sentence.lstrip()[1:]) for sentence in SENTENCE_END.split(text.strip()))
+
+
+def opening_question(state):
+    """The caller's text if this turn is the call's first and has no caller
+    context or personal details."""
+    messages = state["messages"]
+    humans = [m for m in messages if isinstance(m, HumanMessage)]
+    if len(humans) != 1 or not isinstance(messages[0], HumanMessage) or not anonymous(state):
+        return None
+    content = humans[0].content
+    if not isinstance(content, str) or not content.strip() or personal(content):
+        return None
+    return content
+
+
+def lookup(state, system_prompt: str):
+    """A cached AIMessage for this turn, or None."""
+    if not ENABLED or len(state["messages"]) != 1:
+        return None
+    question = opening_question(state)
+    if question is None:
+        return None
+    response_cache = get_response_cache()
+    if response_cache is None:
+        return None
+    with metrics.timer("response_cache"):
+        answer = response_cache.get(question, version=cache_version(system_prompt))
+    metrics.record_cache("response", answer is not None)
+    return AIMessage(content=answer) if answer is not None else None
+
+
+def remember(state, system_prompt: str, response) -> None:
+    """Store ``response`` if it closes a first turn that only read the KB."""
+    if not ENABLED or response.tool_calls or not isinstance(response.content, str):
+        return
+    if not response.content.strip():
+        return
+    question = opening_question(state)
+    if question is None:
+        return
+    for message in state["messages"][1:]:
+        if isinstance(message, AIMessage):
+            if any(call["name"] not in READ_ONLY_TOOLS for call in message.tool_calls or []):
+                return
+        elif isinstance(message, ToolMessage):
+            if message.name not in READ_ONLY_TOOLS or not str(message.content).startswith(KB_ANSWER_PREFIX):
+                return
+        else:
+            return
+    response_cache = get_response_cache()
+    if response_cache is not None:
+        response_cache.put(question, response.content, version=cache_version(system_prompt))
@@ -0,0 +1,401 @@
+import os
+import re
+import heapq
+import bisect
+import threading
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from agent.prompts import CLARA_SYSTEM_PROMPT
+
+# Consultation calendar for each attorney, kept in process. Free slots live in
+# a sorted list so "next free slots after X" is a bisect rather than a scan.
+# Slots offered to a caller are held for HOLD_SECONDS so two callers on the
+# line at once are not offered, and then booked into, the same time. Across
+# workers and replicas the bookings table's unique (attorney, slot_start)
+# index has the last word; see book_consultation. All times are the firm's
+# local time, whatever zone the container runs in.
+SLOT_MINUTES = int(os.getenv("CLARA_SLOT_MINUTES", "30"))
+CONSULT_MINUTES = 15
+HORIZON_DAYS = int(os.getenv("CLARA_BOOKING_HORIZON_DAYS", "14"))
+HOLD_SECONDS = float(os.getenv("CLARA_HOLD_SECONDS", "300"))
+LEAD_MINUTES = int(os.getenv("CLARA_BOOKING_LEAD_MINUTES", "60"))
+TIMEZONE = ZoneInfo("America/Chicago")
+
+ATTORNEYS = {
+    "family law": "Sarah Chen",
+    "personal injury": "Marcus Rodriguez",
+    "criminal defense": "David Kim",
+    "estate planning": "Patricia Williams"
+}
+DEFAULT_ATTORNEY = "Senior Attorney"
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+MONTHS = ["january", "february", "march", "april", "may", "june", "july",
+          "august", "september", "october", "november", "december"]
+
+HOURS_PATTERN = re.compile(
+    r"office hours:\s*(\w+)\s*-\s*(\w+)\s+(\d{1,2})\s*(am|pm)\s*-\s*(\d{1,2})\s*(am|pm)", re.I
+)
+TIME_PATTERN = re.compile(r"\b(\d{1,2})(?::(\d{2}))?\s*(am|pm|a\.m\.|p\.m\.)?(?=\W|$)", re.I)
+ORDINAL = r"(\d{1,2})(?:st|nd|rd|th)?"
+DATE_PATTERN = re.compile(r"\b(" + "|".join(m[:3] for m in MONTHS) + r")[a-z]*\.?\s+(?:the\s+)?" + ORDINAL + r"\b", re.I)
+NUMERIC_DATE_PATTERN = re.compile(r"\b(\d{1,2})/(\d{1,2})(?:/(\d{2}|\d{4}))?\b")
+DAY_OF_MONTH_PATTERN = re.compile(r"\bthe\s+(\d{1,2})(?:st|nd|rd|th)\b", re.I)
+# Anything that looks like the caller named a date, parsed or not.
+DATE_MENTION = re.compile(
+    r"\b(?:" + "|".join(m[:3] for m in MONTHS) + r")[a-z]*\.?\s+\d|\d{1,2}/\d|\b\d{1,2}(?:st|nd|rd|th)\b", re.I
+)
+
+
+def _hour(value: str, meridiem: str) -> int:
+    hour = int(value) % 12
+    return hour + 12 if meridiem.lower() == "pm" else hour
+
+
+def office_hours(prompt: str = CLARA_SYSTEM_PROMPT):
+    """(open weekdays, opening hour, closing hour) from the prompt's office hours line."""
+    match = HOURS_PATTERN.search(prompt)
+    if match is None:
+        return range(0, 5), 9, 18
+    first, last = (WEEKDAYS.index(d) for d in (match[1].lower(), match[2].lower()))
+    return range(first, last + 1), _hour(match[3], match[4]), _hour(match[5], match[6])
+
+
+OPEN_DAYS, OPEN_HOUR, CLOSE_HOUR = office_hours()
+
+
+def attorney_for(practice_area: str) -> str:
+    return ATTORNEYS.get((practice_area or "").lower().strip(), DEFAULT_ATTORNEY)
+
+
+def firm_now() -> datetime:
+    return datetime.now(TIMEZONE)
+
+
+def start_of(day) -> datetime:
+    return datetime.combine(day, datetime.min.time(), tzinfo=TIMEZONE)
+
+
+def slot_label(slot: datetime) -> str:
+    return f"{slot.strftime('%A %B %d')} at {slot.strftime('%I:%M %p').lstrip('0')} {slot.strftime('%Z')}"
+
+
+def day_slots(day: datetime) -> list[datetime]:
+    if day.weekday() not in OPEN_DAYS:
+        return []
+    start = day.replace(hour=OPEN_HOUR, minute=0, second=0, microsecond=0)
+    last = day.replace(hour=CLOSE_HOUR, minute=0, second=0, microsecond=0) - timedelta(minutes=CONSULT_MINUTES)
+    slots = []
+    while start <= last:
+        slots.append(start)
+        start += timedelta(minutes=SLOT_MINUTES)
+    return slots
+
+
+def _upcoming(now: datetime, month: int, day: int, year: int = None):
+    """The date ``month``/``day`` next falls on (or in ``year``), or None if there is no such date."""
+    try:
+        date = now.replace(year=year or now.year, month=month, day=day).date()
+        if year is None and date < now.date():
+            date = date.replace(year=date.year + 1)
+    except ValueError:
+        return None
+    return date
+
+
+def parse_date(text: str, now: datetime):
+    """A calendar date named in ``text``: "October 21st", "10/21" or "the 21st"."""
+    match = DATE_PATTERN.search(text)
+    if match:
+        month = [m[:3] for m in MONTHS].index(match[1][:3].lower()) + 1
+        return _upcoming(now, month, int(match[2]))
+    match = NUMERIC_DATE_PATTERN.search(text)
+    if match:
+        year = int(match[3]) if match[3] else None
+        if year is not None and year < 100:
+            year += 2000
+        return _upcoming(now, int(match[1]), int(match[2]), year)
+    match = DAY_OF_MONTH_PATTERN.search(text)
+    if match:
+        day = int(match[1])
+        if day >= now.day:
+            return _upcoming(now, now.month, day, now.year)
+        month, year = (1, now.year + 1) if now.month == 12 else (now.month + 1, now.year)
+        return _upcoming(now, month, day, year)
+    return None
+
+
+def parse_request(text: str, now: datetime):
+    """Turn "Tuesday 10am", "tomorrow morning" or a slot label into a search.
+
+    Returns (day or None, time or None, (earliest hour, latest hour)); any
+    part the caller did not say is left open.
+    """
+    text = (text or "").lower()
+    day = None
+    if "today" in text:
+        day = now.date()
+    elif "tomorrow" in text:
+        day = (now + timedelta(days=1)).date()
+    else:
+        day = parse_date(text, now)
+        if day is None and not DATE_MENTION.search(text):
+            for offset in range(1, 8):
+                candidate = now + timedelta(days=offset)
+                name = WEEKDAYS[candidate.weekday()]
+                if re.search(rf"\b{name[:3]}(?:{name[3:]})?\b", text):
+                    day = candidate.date()
+                    break
+
+    at = None
+    for match in TIME_PATTERN.finditer(text):
+        hour, minute, meridiem = int(match[1]), int(match[2] or 0), (match[3] or "").replace(".", "")
+        if hour > 23 or minute > 59 or (not meridiem and match[2] is None):
+            continue
+        if meridiem:
+            hour = _hour(str(hour), meridiem)
+        elif hour < OPEN_HOUR - 2:
+            hour += 12
+        at = (hour, minute)
+        break
+
+    window = (0, 24)
+    if at is None:
+        if "morning" in text:
+            window = (0, 12)
+        elif "afternoon" in text:
+            window = (12, 17)
+        elif "evening" in text:
+            window = (17, 24)
+    return day, at, window
+
+
+class AttorneyCalendar:
+    """One attorney's bookable slots with holds and bookings, behind one lock."""
+
+    def __init__(self, attorney: str):
+        self.attorney = attorney
+        self._free = []
+        self._held = {}
+        self._holds_by_owner = {}
+        self._expiry = []
+        self._booked = {}
+        self._through = None
+        self._lock = threading.Lock()
+
+    def _refresh(self, now: datetime):
+        """Release lapsed holds and open days that came into the horizon."""
+        while self._expiry and self._expiry[0][0] <= now:
+            _, slot, owner = heapq.heappop(self._expiry)
+            hold = self._held.get(slot)
+            if hold is not None and hold[0] == owner and hold[1] <= now:
+                self._release_slot(slot)
+
+        horizon = (now + timedelta(days=HORIZON_DAYS)).date()
+        day = now.date() if self._through is None else self._through + timedelta(days=1)
+        while day <= horizon:
+            for slot in day_slots(start_of(day)):
+                if slot not in self._booked and slot not in self._held:
+                    bisect.insort(self._free, slot)
+            day += timedelta(days=1)
+        self._through = horizon
+
+        stale = bisect.bisect_left(self._free, now)
+        if stale:
+            del self._free[:stale]
+
+    def _take_free(self, slot: datetime) -> bool:
+        i = bisect.bisect_left(self._free, slot)
+        if i < len(self._free) and self._free[i] == slot:
+            del self._free[i]
+            return True
+        return False
+
+    def _release_slot(self, slot: datetime):
+        owner, _ = self._held.pop(slot)
+        slots = self._holds_by_owner.get(owner)
+        if slots is not None:
+            slots.discard(slot)
+            if not slots:
+                del self._holds_by_owner[owner]
+        bisect.insort(self._free, slot)
+
+    def release(self, owner: str):
+        with self._lock:
+            for slot in list(self._holds_by_owner.get(owner, ())):
+                self._release_slot(slot)
+
+    def find(self, owner: str, day=None, at=None, window=(0, 24), limit: int = 4, now: datetime = None):
+        """Free slots matching the request, held for ``owner``.
+
+        The caller's own earlier holds are released first, so asking again
+        does not tie up more of the calendar.
+        """
+        now = now or firm_now()
+        earliest = now + timedelta(minutes=LEAD_MINUTES)
+        with self._lock:
+            self._refresh(now)
+            for slot in list(self._holds_by_owner.get(owner, ())):
+                self._release_slot(slot)
+
+            start = earliest
+            if day is not None:
+                start = max(earliest, start_of(day))
+            found = []
+            for i in range(bisect.bisect_left(self._free, start), len(self._free)):
+                slot = self._free[i]
+                if day is not None and slot.date() != day:
+                    break
+                if at is not None and (slot.hour, slot.minute) != at:
+                    continue
+                if not window[0] <= slot.hour < window[1]:
+                    continue
+                found.append(slot)
+                if len(found) == limit:
+                    break
+
+            expires = now + timedelta(seconds=HOLD_SECONDS)
+            for slot in found:
+                self._take_free(slot)
+                self._held[slot] = (owner, expires)
+                self._holds_by_owner.setdefault(owner, set()).add(slot)
+                heapq.heappush(self._expiry, (expires, slot, owner))
+            return found
+
+    def book(self, slot: datetime, owner: str, booking: dict, now: datetime = None) -> bool:
+        """Reserve ``slot`` for ``owner``; False if it is taken or held by someone else."""
+        now = now or firm_now()
+        with self._lock:
+            self._refresh(now)
+            if slot in self._booked or slot < now:
+                return False
+            hold = self._held.get(slot)
+            if hold is not None:
+                if hold[0] != owner:
+                    return False
+                self._release_slot(slot)
+            if not self._take_free(slot):
+                return False
+            self._booked[slot] = booking
+            for held in list(self._holds_by_owner.get(owner, ())):
+                self._release_slot(held)
+            return True
+
+    def mark_booked(self, slot: datetime, booking: dict):
+        """Record a booking made earlier, e.g. one restored from the intake store."""
+        with self._lock:
+            if slot in self._held:
+                self._release_slot(slot)
+            self._take_free(slot)
+            self._booked[slot] = booking
+
+    def held_by(self, owner: str) -> list[datetime]:
+        with self._lock:
+            return sorted(self._holds_by_owner.get(owner, ()))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"free": len(self._free), "held": len(self._held), "booked": len(self._booked)}
+
+
+class Scheduler:
+    def __init__(self):
+        self._calendars = {}
+        self._lock = threading.Lock()
+
+    def calendar(self, attorney: str) -> AttorneyCalendar:
+        calendar = self._calendars.get(attorney)
+        if calendar is None:
+            with self._lock:
+                calendar = self._calendars.setdefault(attorney, AttorneyCalendar(attorney))
+        return calendar
+
+    def offer(self, practice_area: str, owner: str, request: str = "any", limit: int = 4):
+        """(attorney, slots) the caller can be offered; the slots are held for them."""
+        attorney = attorney_for(practice_area)
+        now = firm_now()
+        day, at, window = parse_request("" if request == "any" else request, now)
+        calendar = self.calendar(attorney)
+        slots = calendar.find(owner, day, at, window, limit, now)
+        if not slots and (day is not None or at is not None):
+            slots = calendar.find(owner, limit=limit, now=now)
+        return attorney, slots
+
+    def reserve(self, practice_area: str, owner: str, request: str, booking: dict, claim=None):
+        """Book the slot the caller asked for.
+
+        ``claim(attorney, slot)``, if given, runs once the slot is booked
+        here and returns False if another worker got it first; the slot is
+        then marked taken and the next candidate tried.
+
+        Returns (attorney, slot, alternatives): ``slot`` is None when the
+        request could not be met, and ``alternatives`` are then held for the
+        caller to choose from instead.
+        """
+        attorney = attorney_for(practice_area)
+        calendar = self.calendar(attorney)
+        now = firm_now()
+        day, at, window = parse_request(request, now)
+        if day is None and DATE_MENTION.search(request or ""):
+            # The caller named a date we couldn't read; don't book another day.
+            _, alternatives = self.offer(practice_area, owner, "any")
+            return attorney, None, alternatives
+
+        candidates = [
+            slot for slot in calendar.held_by(owner)
+            if (day is None or slot.date() == day)
+            and (at is None or (slot.hour, slot.minute) == at)
+            and window[0] <= slot.hour < window[1]
+        ]
+        if not candidates and (day is not None or at is not None):
+            candidates = calendar.find(owner, day, at, window, 1, now)
+        if not candidates and day is None and at is None:
+            candidates = calendar.held_by(owner)[:1] or calendar.find(owner, window=window, limit=1, now=now)
+
+        for slot in candidates:
+            if not calendar.book(slot, owner, booking, now):
+                continue
+            if claim is None or claim(attorney, slot):
+                return attorney, slot, []
+            calendar.mark_booked(slot, {"attorney": attorney, "slot_start": slot.isoformat()})
+        _, alternatives = self.offer(practice_area, owner, request)
+        return attorney, None, alternatives
+
+    def release(self, owner: str):
+        """Drop every hold ``owner`` has, e.g. when their call ends."""
+        with self._lock:
+            calendars = list(self._calendars.values())
+        for calendar in calendars:
+            calendar.release(owner)
+
+    def restore(self, bookings) -> int:
+        """Mark stored bookings as taken; rows need attorney and slot_start."""
+        restored = 0
+        for booking in bookings:
+            slot = datetime.fromisoformat(booking["slot_start"])
+            if slot.tzinfo is None:
+                slot = slot.replace(tzinfo=TIMEZONE)
+            else:
+                slot = slot.astimezone(TIMEZONE)
+            self.calendar(booking["attorney"]).mark_booked(slot, booking)
+            restored += 1
+        return restored
+
+    def stats(self) -> dict:
+        with self._lock:
+            calendars = dict(self._calendars)
+        return {attorney: calendar.stats() for attorney, calendar in calendars.items()}
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> Scheduler:
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = Scheduler()
+    return _scheduler
@@ -0,0 +1,315 @@
+import os
+import re
+import csv
+import io
+import json
+import time
+import queue
+import atexit
+import sqlite3
+import threading
+
+from agent import metrics
+
+# Leads captured by the tools. Tools only enqueue a lead; one writer thread
+# drains the queue and commits whole batches, so a live turn never waits on
+# SQLite or an fsync. Bookings are the exception: book_consultation inserts
+# its row straight away, so the unique (attorney, slot_start) index can
+# refuse a slot another worker sharing the database has already booked.
+STORE_DB = os.getenv("CLARA_STORE_DB", "clara_intake.db")
+BATCH_SIZE = int(os.getenv("CLARA_STORE_BATCH", "100"))
+FLUSH_SECONDS = float(os.getenv("CLARA_STORE_FLUSH_SECONDS", "0.5"))
+# A batch that fails is retried, then written row by row; rows that still
+# fail are appended here so no lead is lost.
+WRITE_ATTEMPTS = 3
+FAILED_ROWS = os.getenv("CLARA_STORE_FAILED_ROWS", STORE_DB + ".failed.jsonl")
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS leads ("
+    " lead_id TEXT PRIMARY KEY,"
+    " phone TEXT NOT NULL,"
+    " name TEXT, email TEXT, case_type TEXT, urgency TEXT, notes TEXT,"
+    " call_id TEXT,"
+    " created_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS leads_phone ON leads (phone)",
+    "CREATE INDEX IF NOT EXISTS leads_case_type ON leads (case_type)",
+    "CREATE INDEX IF NOT EXISTS leads_urgency ON leads (urgency)",
+    "CREATE INDEX IF NOT EXISTS leads_created_at ON leads (created_at)",
+    # One row per caller, keyed by normalized phone, so repeat callers show
+    # up once for the intake team however many times they called.
+    "CREATE TABLE IF NOT EXISTS callers ("
+    " phone TEXT PRIMARY KEY,"
+    " name TEXT, email TEXT, case_type TEXT, urgency TEXT,"
+    " first_lead_id TEXT, last_lead_id TEXT,"
+    " leads INTEGER NOT NULL DEFAULT 0,"
+    " first_seen REAL NOT NULL, last_seen REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS callers_case_type ON callers (case_type)",
+    "CREATE INDEX IF NOT EXISTS callers_urgency ON callers (urgency)",
+    "CREATE INDEX IF NOT EXISTS callers_last_seen ON callers (last_seen)",
+    "CREATE TABLE IF NOT EXISTS bookings ("
+    " confirmation_id TEXT PRIMARY KEY,"
+    " phone TEXT NOT NULL,"
+    " client_name TEXT, email TEXT, attorney TEXT, practice_area TEXT,"
+    " slot_start TEXT, scheduled_time TEXT,"
+    " call_id TEXT,"
+    " created_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS bookings_phone ON bookings (phone)",
+    "CREATE INDEX IF NOT EXISTS bookings_practice_area ON bookings (practice_area)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS bookings_slot ON bookings (attorney, slot_start)",
+    "CREATE INDEX IF NOT EXISTS bookings_created_at ON bookings (created_at)",
+]
+
+UPSERT_CALLER = (
+    "INSERT INTO callers (phone, name, email, case_type, urgency, first_lead_id, last_lead_id,"
+    " leads, first_seen, last_seen) VALUES (?, ?, ?, ?, ?, ?, ?, 1, ?, ?) "
+    "ON CONFLICT(phone) DO UPDATE SET"
+    " name = COALESCE(NULLIF(excluded.name, ''), callers.name),"
+    " email = COALESCE(NULLIF(excluded.email, ''), callers.email),"
+    " case_type = COALESCE(NULLIF(excluded.case_type, ''), callers.case_type),"
+    " urgency = CASE WHEN callers.urgency = 'urgent' THEN 'urgent' ELSE excluded.urgency END,"
+    " last_lead_id = excluded.last_lead_id,"
+    " leads = callers.leads + 1,"
+    " last_seen = excluded.last_seen"
+)
+
+EXPORT_TABLES = {
+    "callers": ("last_seen", ("case_type", "urgency")),
+    "leads": ("created_at", ("case_type", "urgency", "phone")),
+    "bookings": ("created_at", ("practice_area", "attorney", "phone")),
+}
+
+
+def normalize_phone(phone: str) -> str:
+    """Digits only, without the US country code, so 512-555-0100 and
+    +1 (512) 555 0100 are the same caller."""
+    digits = re.sub(r"\D", "", phone or "")
+    if len(digits) == 11 and digits.startswith("1"):
+        digits = digits[1:]
+    return digits or (phone or "").strip()
+
+
+class IntakeStore:
+    """SQLite (WAL) store for leads and bookings with a batching writer thread."""
+
+    def __init__(self, path: str = STORE_DB, batch_size: int = BATCH_SIZE, flush_seconds: float = FLUSH_SECONDS):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._queue = queue.Queue()
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        for statement in SCHEMA:
+            conn.execute(statement)
+        conn.commit()
+        self._writer = threading.Thread(target=self._run, name="clara-store-writer", daemon=True)
+        self._writer.start()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def record_lead(self, lead: dict):
+        self._queue.put(("lead", {**lead, "phone": normalize_phone(lead.get("phone")), "created_at": time.time()}))
+
+    def claim_booking(self, booking: dict) -> bool:
+        """Insert ``booking`` now rather than through the writer; False if
+        its attorney already has a booking at its slot_start."""
+        row = {**booking, "phone": normalize_phone(booking.get("phone")), "created_at": time.time()}
+        with metrics.timer("store.claim_booking"), self._conn() as conn:
+            claimed = self._insert_booking(conn, row) == 1
+        metrics.count("bookings_claimed" if claimed else "bookings_conflicted")
+        return claimed
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Block until everything queued so far is committed."""
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        return done.wait(timeout)
+
+    def close(self):
+        self.flush()
+        self._queue.put(None)
+        self._writer.join(timeout=5)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size and batch[-1][0] != "flush":
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._write(batch)
+                    return
+                batch.append(item)
+            self._write(batch)
+
+    def _write(self, batch):
+        rows = [(kind, row) for kind, row in batch if kind != "flush"]
+        try:
+            if rows:
+                with metrics.timer("store.write"):
+                    self._write_rows(rows)
+        finally:
+            for kind, done in batch:
+                if kind == "flush":
+                    done.set()
+
+    def _commit(self, rows):
+        with self._conn() as conn:
+            for kind, row in rows:
+                if kind == "lead":
+                    self._insert_lead(conn, row)
+                else:
+                    self._insert_booking(conn, row)
+
+    def _write_rows(self, rows):
+        """Commit ``rows`` as one transaction, retrying a locked or busy
+        database; if the batch still fails, commit row by row so one bad
+        row can't take the others with it."""
+        for attempt in range(WRITE_ATTEMPTS):
+            try:
+                self._commit(rows)
+                metrics.count("store_rows_written", len(rows))
+                return
+            except sqlite3.Error as e:
+                metrics.count("store_write_errors")
+                error = e
+                time.sleep(0.05 * 2 ** attempt)
+        print(f"\n⚠️  Intake store batch failed ({len(rows)} rows): {error}; writing rows one at a time")
+        for kind, row in rows:
+            try:
+                self._commit([(kind, row)])
+                metrics.count("store_rows_written")
+            except sqlite3.Error as e:
+                metrics.count("store_rows_failed")
+                self._keep_failed(kind, row, e)
+
+    def _keep_failed(self, kind, row, error):
+        print(f"\n⚠️  Intake store could not save {kind} {row.get('lead_id') or row.get('confirmation_id')}: {error}")
+        try:
+            with open(FAILED_ROWS, "a", encoding="utf-8") as out:
+                out.write(json.dumps({"kind": kind, "row": row, "error": str(error)}, default=str) + "\n")
+        except OSError as e:
+            print(f"\n⚠️  Could not write {FAILED_ROWS}: {e}")
+
+    @staticmethod
+    def _insert_lead(conn, row):
+        conn.execute(
+            "INSERT OR IGNORE INTO leads (lead_id, phone, name, email, case_type, urgency, notes, call_id, created_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (row["lead_id"], row["phone"], row.get("name"), row.get("email"), row.get("case_type"),
+             row.get("urgency"), row.get("notes"), row.get("call_id"), row["created_at"])
+        )
+        conn.execute(
+            UPSERT_CALLER,
+            (row["phone"], row.get("name", ""), row.get("email", ""), row.get("case_type", ""),
+             row.get("urgency", "normal"), row["lead_id"], row["lead_id"], row["created_at"], row["created_at"])
+        )
+
+    @staticmethod
+    def _insert_booking(conn, row) -> int:
+        return conn.execute(
+            "INSERT OR IGNORE INTO bookings (confirmation_id, phone, client_name, email, attorney,"
+            " practice_area, slot_start, scheduled_time, call_id, created_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (row["confirmation_id"], row["phone"], row.get("client_name"), row.get("email"),
+             row.get("attorney"), row.get("practice_area"), row.get("slot_start"),
+             row.get("scheduled_time"), row.get("call_id"), row["created_at"])
+        ).rowcount
+
+    def export(self, table: str, since: float = None, **filters):
+        """Rows of ``table`` (callers, leads or bookings), oldest first.
+
+        Arguments are checked straight away; rows are read lazily on a
+        connection of the export's own, so the caller may iterate them from
+        any thread (StreamingResponse does).
+        """
+        if table not in EXPORT_TABLES:
+            raise ValueError(f"Unknown export table: {table}")
+        time_column, filterable = EXPORT_TABLES[table]
+        clauses, params = [], []
+        if since is not None:
+            clauses.append(f"{time_column} >= ?")
+            params.append(since)
+        for column, value in filters.items():
+            if value is None:
+                continue
+            if column not in filterable:
+                raise ValueError(f"Cannot filter {table} by {column}")
+            clauses.append(f"{column} = ?")
+            params.append(normalize_phone(value) if column == "phone" else value)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._rows(f"SELECT * FROM {table}{where} ORDER BY {time_column}", params)
+
+    def _rows(self, query: str, params: list):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        try:
+            for row in conn.execute(query, params):
+                yield dict(row)
+        finally:
+            conn.close()
+
+    def upcoming_bookings(self, after: str):
+        cursor = self._conn().execute(
+            "SELECT attorney, slot_start, confirmation_id, client_name, phone FROM bookings"
+            " WHERE slot_start >= ? ORDER BY slot_start",
+            (after,)
+        )
+        for row in cursor:
+            yield dict(row)
+
+
+def export_lines(rows, fmt: str = "jsonl"):
+    """Serialize export rows as JSON lines or CSV, one chunk per row."""
+    if fmt == "jsonl":
+        return (json.dumps(row) + "\n" for row in rows)
+    if fmt != "csv":
+        raise ValueError(f"Unknown export format: {fmt}")
+    return _csv_lines(rows)
+
+
+def _csv_lines(rows):
+    buffer = io.StringIO()
+    writer = None
+    for row in rows:
+        if writer is None:
+            writer = csv.DictWriter(buffer, fieldnames=list(row))
+            writer.writeheader()
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def restore_bookings() -> int:
+    """Load upcoming bookings into the scheduler so a restart can't re-offer them."""
+    from agent.scheduling import firm_now, get_scheduler
+
+    return get_scheduler().restore(get_store().upcoming_bookings(firm_now().isoformat()))
+
+
+_store = None
+_lock = threading.Lock()
+
+
+def get_store() -> IntakeStore:
+    global _store
+    if _store is None:
+        with _lock:
+            if _store is None:
+                _store = IntakeStore()
+                atexit.register(_store.flush)
+    return _store
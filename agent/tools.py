@@ -1,7 +1,19 @@
 import json
 import os
-from datetime import datetime, timedelta
+import asyncio
+import functools
+from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
+from agent import metrics
+from agent.ids import new_id
+from agent.knowledge import retrieve
+from agent.scheduling import HORIZON_DAYS, get_scheduler, slot_label
+from agent.store import get_store
+
+def call_id(config) -> str:
+    """The call a tool is running for; holds and bookings are keyed by it."""
+    return str(((config or {}).get("configurable") or {}).get("thread_id") or "")
+
 
 @tool
 def book_consultation(
@@ -9,32 +21,53 @@ def book_consultation(
     phone: str,
     practice_area: str,
     preferred_time: str,
-    email: str = ""
+    email: str = "",
+    config: RunnableConfig = None
 ) -> str:
     """
     Books a free 15-minute consultation with the appropriate attorney.
     Use this when the caller is ready to schedule and has provided
     their name, phone number, and preferred time.
     """
-    confirmation_id = f"MLAW-{datetime.now().strftime('%Y%m%d%H%M%S')}" 
-    
-    attorney_map = {
-        "family law": "Sarah Chen, J.D.",
-        "personal injury": "Marcus Rodriguez, J.D.",
-        "criminal defense": "David Kim, J.D.",
-        "estate planning": "Patricia Williams, J.D."
-    }
-    attorney = attorney_map.get(practice_area.lower(), "Senior Attorney")
-
+    confirmation_id = new_id("MLAW")
+
+    booking = {"client_name": caller_name, "phone": phone, "confirmation_id": confirmation_id}
+
+    def claim(attorney, slot):
+        return get_store().claim_booking({
+            **booking,
+            "email": email,
+            "attorney": attorney,
+            "practice_area": practice_area,
+            "slot_start": slot.isoformat(),
+            "scheduled_time": slot_label(slot),
+            "call_id": call_id(config)
+        })
+
+    attorney, slot, alternatives = get_scheduler().reserve(
+        practice_area, call_id(config) or phone, preferred_time, booking, claim
+    )
+    if slot is None:
+        print(f"\n[TOOL] book_consultation → {caller_name} | {practice_area} | {preferred_time} taken")
+        return json.dumps({
+            "status": "unavailable",
+            "attorney": attorney,
+            "requested_time": preferred_time,
+            "available_slots": [slot_label(s) for s in alternatives],
+            "message": f"That time is no longer available with {attorney}. Offer one of the available slots."
+        })
+
+    attorney = f"{attorney}, J.D."
+    scheduled_time = slot_label(slot)
     result = {
         "status": "confirmed", 
         "confirmation_id": confirmation_id,
         "client_name": caller_name,
         "attorney": attorney,
         "practice_area": practice_area,
-        "scheduled_time": preferred_time,
+        "scheduled_time": scheduled_time,
         "duration": "15 minutes",
-        "message": f"Booked! {attorney} will call {phone} at {preferred_time}."
+        "message": f"Booked! {attorney} will call {phone} at {scheduled_time}."
     }
 
     print(f"\n[TOOL] book_consultation → {caller_name} | {practice_area}")
@@ -42,19 +75,20 @@ def book_consultation(
 
 @tool
 def capture_lead(
-    name:str,
-    phone:str,
-    case_type:str,
-    notes:str,
-    email:str="",
-    urgency:str="normal" 
+    name: str,
+    phone: str,
+    case_type: str,
+    notes: str,
+    email: str = "",
+    urgency: str = "normal",
+    config: RunnableConfig = None
 ) -> str:
     """
     Saves caller information to the CRM as a new lead.
     Use this for every caller even if they do not book immediately.
     Always capture the lead before ending the conversation.
     """
-    lead_id=f"HS-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    lead_id = new_id("HS")
 
     result = {
         "status": "saved",
@@ -68,99 +102,16 @@ def capture_lead(
         "message": f"Lead {lead_id} saved. Intake team notified."
     }
 
-    print(f"\n [TOOL] capture_lead->{name}|{case_type}|{urgency}")
-    return json.dumps(result)
-
-@tool
-def escalate_urgent_case(
-    caller_name:str,
-    phone: str,
-    situation: str 
-
-)->str:
-    """
-    Immediately escalates urgent cases to the on-call attorney.
-    Use when caller mentions arrest, detention, custody emergency,
-    restraining order violation, or says they need help RIGHT NOW.
-    This should be called before any other tool in urgent situations.
-    """
-
-    alert_id=f"URGENT-{datetime.now().strtime('%Y%m%d%H%M%S')}"
-
-    result={
-        "status":"escalated",
-        "alert_id":alert_id,
-        "on_call_attorney": "David Kim, J.D.",
-        "expected_callback": "Within 15 minutes",
-        "message": (
-            f"URGENT alert sent. Attorney David Kim has been notified "
-            f"and will call {phone} within 15 minutes. "
-            f"If with police: say I am invoking my right to remain silent "
-            f"and my right to an attorney."
-        )
-    }
-    print(f"\n[TOOL]escalate_urgent_case->{caller_name}|{situation}")
-    return json.dumps(result)
-
-@tool
-def check_availability(
-    practice_area:str,
-    preferred_day:str = "any"
-
-) -> str:
-    """
-    Checks available consultation slots for the specified practice area.
-    Use this when the caller asks when they can meet or before booking.
-    """
-    today =datetime.now()
-    slots=[]
-    for i in range(1,4):
-        day= today +timedelta(days=i)
-        if day.weekday() <5:
-            slots.append(f"{day.strftime('%A %B %d')} at 10:00 AM CST")
-            slots.append(f"{day.strftime('%A %B %d')} at 2:30 PM CST")
-    attorney_map={
-        "family law": "Sarah Chen",
-        "personal injury": "Marcus Rodriguez",
-        "criminal defense": "David Kim",
-        "estate planning": "Patricia Williams"
-
-    }
-    attorney=attorney_map.get(practice_area.lower(),"our attorney")
-
-    result={
-        "attorney": attorney,
-        "available_slots": slots[:4],
-        "duration": "15 minutes free consultation",
-        "message": f"{attorney} has openings available."
-    }
-@tool
-def capture_lead(
-    name: str,
-    phone: str,
-    case_type: str,
-    notes: str,
-    email: str = "",
-    urgency: str = "normal"
-) -> str:
-    """
-    Saves caller information to the CRM as a new lead.
-    Use this for every caller even if they do not book immediately.
-    Always capture the lead before ending the conversation.
-    """
-    lead_id = f"HS-{datetime.now().strftime('%Y%m%d%H%M%S')}"
-
-    result = {
-        "status": "saved",
+    get_store().record_lead({
         "lead_id": lead_id,
-        "name": name,
         "phone": phone,
+        "name": name,
+        "email": email,
         "case_type": case_type,
         "urgency": urgency,
         "notes": notes,
-        "assigned_to": "Intake Team",
-        "message": f"Lead {lead_id} saved. Intake team notified."
-    }
+        "call_id": call_id(config)
+    })
 
     print(f"\n[TOOL] capture_lead → {name} | {case_type} | {urgency}")
     return json.dumps(result)
@@ -177,7 +128,7 @@ def escalate_urgent_case(
     restraining order violation, or says they need help RIGHT NOW.
     This should be called before any other tool in urgent situations.
     """
-    alert_id = f"URGENT-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    alert_id = new_id("URGENT")
 
     result = {
         "status": "escalated",
@@ -198,39 +149,32 @@ def escalate_urgent_case(
 @tool
 def check_availability(
     practice_area: str,
-    preferred_day: str = "any"
+    preferred_day: str = "any",
+    config: RunnableConfig = None
 ) -> str:
     """
     Checks available consultation slots for the specified practice area.
     Use this when the caller asks when they can meet or before booking.
     """
-    today = datetime.now()
-    slots = []
-    for i in range(1, 4):
-        day = today + timedelta(days=i)
-        if day.weekday() < 5:
-            slots.append(f"{day.strftime('%A %B %d')} at 10:00 AM CST")
-            slots.append(f"{day.strftime('%A %B %d')} at 2:30 PM CST")
-
-    attorney_map = {
-        "family law": "Sarah Chen",
-        "personal injury": "Marcus Rodriguez",
-        "criminal defense": "David Kim",
-        "estate planning": "Patricia Williams"
-    }
-    attorney = attorney_map.get(practice_area.lower(), "our attorney")
+    attorney, slots = get_scheduler().offer(practice_area, call_id(config) or "anonymous", preferred_day)
 
     result = {
         "attorney": attorney,
-        "available_slots": slots[:4],
+        "available_slots": [slot_label(slot) for slot in slots],
         "duration": "15 minutes free consultation",
-        "message": f"{attorney} has openings available."
+        "message": f"{attorney} has openings available." if slots else
+                   f"{attorney} has no openings in the next {HORIZON_DAYS} days. Offer to take their details."
     }
 
     print(f"\n📆 [TOOL] check_availability → {practice_area}")
     return json.dumps(result)
 
 
+# Start of every successful search_firm_knowledge result; the response cache
+# only keeps answers built on one.
+KB_ANSWER_PREFIX = "Based on our firm information:"
+
+
 @tool
 def search_firm_knowledge(query: str) -> str:
     """
@@ -241,64 +185,75 @@ def search_firm_knowledge(query: str) -> str:
     Args:
         query: The question or topic to search for
     """
-    import os
-    import boto3
-    from dotenv import load_dotenv
-    load_dotenv()
-
-    client = boto3.client(
-        "bedrock-agent-runtime",
-        region_name="us-east-1",
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY")
-    )
-
+    print(f"\n🔍 [TOOL] search_firm_knowledge → {query}")
     try:
-        response = client.retrieve(
-            knowledgeBaseId=os.getenv("BEDROCK_KNOWLEDGE_BASE_ID"),
-            retrievalQuery={"text": query},
-            retrievalConfiguration={
-                "vectorSearchConfiguration": {"numberOfResults": 3}
-            }
-        )
-
-        results = response.get("retrievalResults", [])
-        if not results:
-            return "I don't have specific information about that. Let me connect you with one of our attorneys."
-
-        context = "\n\n".join([r["content"]["text"] for r in results])
-        return f"Based on our firm information:\n\n{context}"
-
+        results = retrieve(query)
     except Exception as e:
         return f"I'm unable to retrieve that information right now. Please call us directly at (312) 555-0100."
 
-    query_lower = query.lower()
-    found = []
-    for key, value in knowledge.items():
-        if key in query_lower:
-            found.append(value)
+    if not results:
+        return "I don't have specific information about that. Let me connect you with one of our attorneys."
 
-    if found:
-        result = {"found": True, "information": " ".join(found)}
-    else:
-        result = {
-            "found": False,
-            "information": "Best answered by an attorney in your free consultation."
-        }
+    context = "\n\n".join(results)
+    return f"{KB_ANSWER_PREFIX}\n\n{context}"
 
-    print(f"\n🔍 [TOOL] search_firm_knowledge → {query}")
-    return json.dumps(result)
 
+# Default per-tool timeout in seconds; override one tool with e.g.
+# CLARA_TOOL_TIMEOUT_SEARCH_FIRM_KNOWLEDGE=3. A timeout can't stop the worker
+# thread, so tools with side effects have none: a booking or lead that still
+# lands after the model was told it failed would be made twice on the retry.
+TOOL_TIMEOUT = float(os.getenv("CLARA_TOOL_TIMEOUT", "8"))
+SIDE_EFFECT_TOOLS = {"book_consultation", "capture_lead", "escalate_urgent_case"}
 
-ALL_TOOLS = [
-    book_consultation,
-    capture_lead,
-    escalate_urgent_case,
-    check_availability,
-    search_firm_knowledge
-]
 
+def tool_timeout(name: str):
+    """Seconds ``name`` may run on the async path, or None for no limit."""
+    if name in SIDE_EFFECT_TOOLS:
+        return None
+    return float(os.getenv(f"CLARA_TOOL_TIMEOUT_{name.upper()}", TOOL_TIMEOUT))
 
 
+def make_async(clara_tool):
+    """Give a sync @tool an async path with a timeout.
 
-    
+    ToolNode gathers the async paths of every tool call in a step, so several
+    calls emitted together run side by side and the step waits only for the
+    slowest one. A read-only call that overruns its timeout returns an error
+    payload the model can talk around instead of stalling the turn.
+    """
+    func = clara_tool.func
+    timeout = tool_timeout(clara_tool.name)
+    stage = f"tool.{clara_tool.name}"
+
+    @functools.wraps(func)
+    def timed(**kwargs):
+        with metrics.timer(stage):
+            return func(**kwargs)
+
+    @functools.wraps(func)
+    async def run(**kwargs):
+        try:
+            return await asyncio.wait_for(asyncio.to_thread(timed, **kwargs), timeout)
+        except asyncio.TimeoutError:
+            metrics.count("tool_timeouts")
+            print(f"\n⏳ [TOOL] {clara_tool.name} timed out after {timeout:.1f}s")
+            return json.dumps({
+                "status": "timeout",
+                "message": f"{clara_tool.name} did not respond in time. "
+                           f"Apologise and offer to have the team follow up."
+            })
+
+    clara_tool.func = timed
+    clara_tool.coroutine = run
+    return clara_tool
+
+
+ALL_TOOLS = [
+    make_async(t) for t in (
+        book_consultation,
+        capture_lead,
+        escalate_urgent_case,
+        check_availability,
+        search_firm_knowledge
+    )
+]
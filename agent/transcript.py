@@ -0,0 +1,103 @@
+import os
+import json
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from agent import metrics
+from agent.cache import TTLCache
+from agent.memory import create_initial_state
+
+# Stateless mode: Vapi sends the whole conversation on every turn, so the
+# history is rebuilt from that instead of being kept by a checkpointer or the
+# session store. What the transcript can't show (tool outcomes such as a
+# saved lead or a booking, the rolling summary) lives in a small side record
+# with no messages in it, so any replica can take any turn.
+STATELESS = os.getenv("CLARA_STATELESS", "0") == "1"
+SIDE_RECORD_FIELDS = ("caller_info", "tools_called", "call_start_time", "summary", "summarized_upto")
+
+# Converted transcripts per call. A replica that served the call's last turn
+# converts only the messages added since; any other replica converts it all.
+_converted = TTLCache(
+    maxsize=int(os.getenv("CLARA_TRANSCRIPT_CACHE_SIZE", "1000")),
+    ttl_seconds=float(os.getenv("CLARA_SESSION_TTL", "3600"))
+)
+
+
+def _fingerprint(messages) -> int:
+    return hash(tuple(
+        (m.get("role"), str(m.get("content")), json.dumps(m.get("tool_calls"), sort_keys=True) if m.get("tool_calls") else "")
+        for m in messages
+    ))
+
+
+def to_langchain(message: dict):
+    """One OpenAI-format message as a LangChain message, or None to skip it.
+
+    System messages are dropped (Clara's own prompt is used) and so are
+    empty assistant turns.
+    """
+    role = message.get("role")
+    content = message.get("content") or ""
+    if role == "user":
+        return HumanMessage(content=content)
+    if role == "assistant":
+        tool_calls = []
+        for call in message.get("tool_calls") or []:
+            function = call.get("function", {})
+            try:
+                args = json.loads(function.get("arguments") or "{}")
+            except ValueError:
+                args = {}
+            tool_calls.append({"id": call.get("id"), "name": function.get("name", ""), "args": args})
+        if not content and not tool_calls:
+            return None
+        return AIMessage(content=content, tool_calls=tool_calls)
+    if role == "tool":
+        return ToolMessage(content=content, tool_call_id=message.get("tool_call_id", ""))
+    return None
+
+
+def convert(session_id: str, messages: list) -> list:
+    """LangChain history for ``messages``, reusing the call's last conversion.
+
+    The conversation has to open on a caller message for Bedrock, so
+    anything before the first one (Vapi's greeting) is left out.
+    """
+    cached = _converted.get(session_id)
+    if cached is not None and len(messages) >= cached[0] and _fingerprint(messages[:cached[0]]) == cached[1]:
+        seen, history = cached[0], list(cached[2])
+        metrics.count("transcript_messages_reused", seen)
+    else:
+        seen, history = 0, []
+    for message in messages[seen:]:
+        converted = to_langchain(message)
+        if converted is None or (not history and not isinstance(converted, HumanMessage)):
+            continue
+        history.append(converted)
+    metrics.count("transcript_messages_converted", len(messages) - seen)
+    _converted.put(session_id, (len(messages), _fingerprint(messages), tuple(history)))
+    return history
+
+
+def rebuild_state(session_id: str, messages: list, side_record: dict = None):
+    """AgentState for a turn: the transcript up to the caller's latest
+    message (achat adds that one), plus the side record."""
+    last_user = max((i for i, m in enumerate(messages) if m.get("role") == "user"), default=len(messages))
+    state = create_initial_state(session_id=session_id)
+    for field in SIDE_RECORD_FIELDS:
+        if side_record and field in side_record:
+            state[field] = side_record[field]
+    state["messages"] = convert(session_id, messages[:last_user])
+    if state["summarized_upto"] > len(state["messages"]):
+        # The client sent a shorter history than last time; start over.
+        state["summary"], state["summarized_upto"] = "", 0
+    return state
+
+
+def side_record(state) -> dict:
+    """What to keep between turns in stateless mode: the state without messages."""
+    return {**{field: state[field] for field in SIDE_RECORD_FIELDS if field in state}, "session_id": state["session_id"], "messages": []}
+
+
+def forget(session_id: str):
+    _converted.delete(session_id)
@@ -0,0 +1,129 @@
+import re
+import uuid
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from agent import metrics
+from agent.tools import escalate_urgent_case
+from agent.memory import CallRecord
+
+# Cheap pattern check that runs before the LLM on every caller turn. A match
+# escalates straight away and answers with URGENT_REPLY, so a caller who has
+# just been arrested hears back in milliseconds rather than after two Bedrock
+# round-trips. A match only counts when the turn also says it is happening
+# now and nothing marks it as past or hypothetical; anything ambiguous ("I was
+# arrested two years ago", "am I going to be arrested?") is left to the model
+# and the system prompt.
+URGENT_PATTERNS = [
+    ("arrest or detention", re.compile(
+        r"\b(?:arrested|under arrest|detained|in jail|locked up|handcuffed"
+        r"|in (?:police )?custody|at the police station)\b"
+    )),
+    ("custody emergency", re.compile(
+        r"\b(?:emergency custody|custody emergency"
+        r"|(?:took|taken|kidnapped|won'?t (?:give|bring) back) (?:my |our )?(?:kids?|children|son|daughter)"
+        r"|(?:kids?|children|son|daughter) (?:was|were|has been|have been) taken)\b"
+    )),
+    ("restraining order violation", re.compile(
+        r"\b(?:violat\w* (?:the |my |a |his |her |their )?(?:restraining|protective) order"
+        r"|(?:restraining|protective) order (?:was |is |being |got )?violated)\b"
+    )),
+    ("needs a lawyer right now", re.compile(
+        r"\bneed (?:a |an )?(?:lawyer|attorney) (?:right now|immediately|asap)\b"
+    )),
+]
+NEGATED_ARREST = re.compile(r"\b(?:not|never|wasn'?t|weren'?t)\s+(?:been\s+|being\s+)?(?:arrested|detained)\b")
+# A recency cue only counts right next to the event ("just arrested",
+# "arrested today", "still detained"); "I just have a question about my
+# brother who was arrested" is not an emergency.
+EVENT = (
+    r"(?:arrested|under arrest|detained|in jail|locked up|handcuffed|in (?:police )?custody"
+    r"|at the police station|custody|took|taken|kidnapped|violat\w*|picked up)"
+)
+NOW = (
+    r"(?:right now|just now|today|tonight|this (?:morning|afternoon|evening)|as we speak"
+    r"|at the moment|(?:a few |\d+ )?(?:minutes?|an hour|hours?) ago)"
+)
+RIGHT_NOW = re.compile(
+    rf"\b(?:(?:just|currently|still) (?:been |got |gotten |was |were )?{EVENT}"
+    rf"|{EVENT}(?: [a-z']+){{0,3}} {NOW}"
+    rf"|(?:am|is|are|i'?m|he'?s|she'?s|they'?re|we're) (?:being|still|currently) {EVENT}"
+    r"|(?:am|is|are|i'?m|he'?s|she'?s|they'?re|we're) (?:in jail|under arrest|detained|locked up"
+    r"|handcuffed|in (?:police )?custody|at the police station)"
+    r"|won'?t (?:give|bring) (?:them |him |her )?back)\b"
+)
+PAST_OR_HYPOTHETICAL = re.compile(
+    r"\b(?:(?:days?|weeks?|months?|years?) ago|last (?:week|month|year)|in (?:19|20)\d\d"
+    r"|(?:case|charges?) (?:is |are |was |were |got )?(?:closed|dismissed|dropped)"
+    r"|expunge\w*|seal(?:ed)? (?:my |the )?record|criminal record|used to"
+    r"|going to be|gonna be|will i|could i|can i be|might|what if|if i (?:get|got|am|was))\b"
+)
+
+URGENT_REPLY = (
+    "I'm so sorry you're going through this. I've just sent an urgent alert "
+    "to our on-call attorney, David Kim, who will call you within 15 minutes. "
+    "If you are with the police, say: I am invoking my right to remain silent "
+    "and my right to an attorney. Can I confirm your name and the best number "
+    "to reach you?"
+)
+
+
+def classify_urgency(text: str):
+    """Return the matched situation, or None if the turn is not clearly an
+    emergency happening now."""
+    text = text.lower()
+    if PAST_OR_HYPOTHETICAL.search(text):
+        return None
+    happening_now = RIGHT_NOW.search(text) is not None
+    for situation, pattern in URGENT_PATTERNS:
+        # "need a lawyer right now" carries its own recency cue.
+        if pattern.search(text) and (happening_now or situation == "needs a lawyer right now"):
+            if situation == "arrest or detention" and NEGATED_ARREST.search(text):
+                continue
+            return situation
+    return None
+
+
+def triage_node(state) -> dict:
+    caller_info = state.get("caller_info") or {}
+    if caller_info.get("urgency") == "urgent":
+        return {}
+
+    last_message = state["messages"][-1] if state["messages"] else None
+    if not isinstance(last_message, HumanMessage):
+        return {}
+
+    with metrics.timer("triage"):
+        situation = classify_urgency(str(last_message.content))
+    if situation is None:
+        return {}
+
+    args = {
+        "caller_name": caller_info.get("name", "Unknown caller"),
+        "phone": caller_info.get("phone", "unknown"),
+        "situation": f"{situation}: {last_message.content}"
+    }
+    call_id = f"triage-{uuid.uuid4().hex[:12]}"
+    result = escalate_urgent_case.invoke(args)
+    record = CallRecord.from_caller_info(caller_info)
+    record.apply_tool_result(escalate_urgent_case.name, args, result)
+
+    print(f"\n🚨 Fast-path escalation: {situation}")
+    return {
+        "messages": [
+            AIMessage(content="", tool_calls=[{
+                "name": escalate_urgent_case.name,
+                "args": args,
+                "id": call_id
+            }]),
+            ToolMessage(content=result, tool_call_id=call_id, name=escalate_urgent_case.name),
+            AIMessage(content=URGENT_REPLY)
+        ],
+        "caller_info": record.as_caller_info(),
+        "tools_called": [escalate_urgent_case.name]
+    }
+
+
+def after_triage(state) -> str:
+    if isinstance(state["messages"][-1], AIMessage):
+        return "done"
+    return "agent"
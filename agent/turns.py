@@ -0,0 +1,146 @@
+import json
+import asyncio
+import hashlib
+import weakref
+
+from agent import metrics
+from agent.cache import TTLCache
+
+
+def idempotency_key(scope: str, messages: list, explicit: str = None) -> str:
+    """Same scope (route and call) and same message list -> same key, so a
+    retry finds the first run."""
+    if explicit:
+        payload = [scope, explicit]
+    else:
+        payload = [scope, [(m.get("role"), m.get("content")) for m in messages]]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class TurnRecord:
+    """Everything one turn produced, replayable to any number of requests."""
+
+    def __init__(self, cancel_when_abandoned: bool = False):
+        self.items = []
+        self.done = False
+        self.error = None
+        self.task = None
+        self.cancelled = False
+        self.followers = 0
+        self.cancel_when_abandoned = cancel_when_abandoned
+        self._changed = asyncio.Event()
+
+    def publish(self, item):
+        self.items.append(item)
+        self._wake()
+
+    def finish(self, error: BaseException = None):
+        self.done = True
+        self.error = error
+        self._wake()
+
+    def _wake(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def cancel(self):
+        if self.task is not None and not self.done:
+            self.cancelled = True
+            self.task.cancel()
+
+    async def follow(self):
+        """Yield items already produced, then new ones as they arrive.
+
+        If the last follower leaves before the turn is done (the client hung
+        up) and the record was started with ``cancel_when_abandoned``, the
+        turn is cancelled.
+        """
+        seen = 0
+        self.followers += 1
+        try:
+            while True:
+                while seen < len(self.items):
+                    yield self.items[seen]
+                    seen += 1
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await self._changed.wait()
+        finally:
+            self.followers -= 1
+            if not self.followers and not self.done and self.cancel_when_abandoned:
+                self.cancel()
+
+
+class TurnGate:
+    """Serializes turns per call and collapses retried requests into one run.
+
+    Vapi retries, and callers talk over Clara, so two requests for the same
+    call can arrive together. Each call gets an asyncio.Lock, held for the
+    whole turn (load state, run the graph, save state), so turns of one call
+    never interleave. Each turn runs as its own task, keyed by an
+    idempotency key. A request whose key matches a turn in flight, or one
+    that finished in the last ``ttl_seconds``, replays that turn's output
+    instead of paying for a second Bedrock run.
+
+    With ``cancel_abandoned``, a streamed turn whose requests have all gone
+    away is cancelled: when a caller interrupts, Vapi drops the stream and
+    sends a new turn, and the old answer is no longer worth finishing.
+    """
+
+    def __init__(self, ttl_seconds: float = 120, maxsize: int = 2048, cancel_abandoned: bool = True):
+        self.cancel_abandoned = cancel_abandoned
+        self._locks = weakref.WeakValueDictionary()
+        self._inflight = {}
+        self._recent = TTLCache(maxsize=maxsize, ttl_seconds=ttl_seconds)
+
+    def session_lock(self, session_id: str) -> asyncio.Lock:
+        lock = self._locks.get(session_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[session_id] = lock
+        return lock
+
+    def start(self, key: str, session_id: str, run, streamed: bool = False) -> tuple[TurnRecord, bool]:
+        """The record for ``key``, and whether this request started it.
+
+        ``run`` is an async generator function; its items are published to
+        the record as they are produced. Only ``streamed`` turns are
+        cancelled when abandoned; a plain request can't tell it was dropped.
+        """
+        record = self._inflight.get(key) or self._recent.get(key)
+        if record is not None and not record.cancelled:
+            metrics.count("turn_retries_joined")
+            return record, False
+        record = TurnRecord(cancel_when_abandoned=streamed and self.cancel_abandoned)
+        self._inflight[key] = record
+        record.task = asyncio.create_task(self._run(key, session_id, record, run))
+        return record, True
+
+    async def _run(self, key: str, session_id: str, record: TurnRecord, run):
+        lock = self.session_lock(session_id)
+        try:
+            if lock.locked():
+                metrics.count("turns_queued_behind_session")
+            async with lock:
+                async for item in run():
+                    record.publish(item)
+            record.finish()
+            self._recent.put(key, record)
+        except BaseException as e:
+            record.finish(e)
+            if isinstance(e, asyncio.CancelledError):
+                metrics.count("turns_cancelled")
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            if self._inflight.get(key) is record:
+                del self._inflight[key]
+
+    def stats(self) -> dict:
+        return {
+            "sessions_locked": sum(1 for lock in list(self._locks.values()) if lock.locked()),
+            "turns_in_flight": len(self._inflight),
+            "recent_turns": len(self._recent)
+        }
@@ -1,22 +1,201 @@
 import os
 import json
+import time
+import hmac
+import uuid
 import asyncio
-from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse, StreamingResponse
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
-from agent.agent import chat
-from agent.memory import create_initial_state
+from agent import metrics, response_cache
+from agent.agent import achat, astream_chat, answer_outside_graph, get_clara
+from agent.admission import AdmissionController, Overloaded, take_message
+from agent.memory import create_initial_state, get_session_store
+from agent.clients import warm_clients
+from agent.checkpoints import get_checkpointer, end_thread
+from agent.knowledge import warm_index, resync_knowledge_base, retrieval_cache
+from agent.turns import TurnGate, idempotency_key
+from agent.triage import classify_urgency
+from agent.store import get_store, restore_bookings, export_lines
+from agent.scheduling import get_scheduler
+from agent import transcript
 
 load_dotenv()
 
-app = FastAPI()
+# Max agent turns running at once in this worker. Bedrock and the tools are
+# blocking calls, so each in-flight turn holds an executor thread; turns past
+# the limit queue in `admission` instead of piling onto the thread pool. A
+# turn that can't start within CLARA_TURN_DEADLINE seconds of its request
+# arriving, or finds the queue full, gets a quick message-taking reply.
+MAX_CONCURRENT_TURNS = int(os.getenv("CLARA_MAX_CONCURRENT_TURNS", "32"))
+TENANT_MAX_TURNS = int(os.getenv("CLARA_TENANT_MAX_TURNS", str(MAX_CONCURRENT_TURNS)))
+MAX_QUEUED_TURNS = int(os.getenv("CLARA_MAX_QUEUED_TURNS", str(MAX_CONCURRENT_TURNS * 2)))
+TURN_DEADLINE = float(os.getenv("CLARA_TURN_DEADLINE", "3.0"))
+# /intake/export streams every lead's contact details, so it is off unless a
+# key is configured and then needs that key as a bearer token or X-API-Key.
+INTAKE_API_KEY = os.getenv("CLARA_INTAKE_API_KEY", "")
+EXECUTOR_THREADS = int(os.getenv("CLARA_EXECUTOR_THREADS", str(MAX_CONCURRENT_TURNS * 2)))
 
-sessions = {}
+admission = AdmissionController(MAX_CONCURRENT_TURNS, TENANT_MAX_TURNS, MAX_QUEUED_TURNS)
+
+
+readiness = {"ready": False, "warmup_seconds": None}
+
+
+async def warm_up():
+    started = time.perf_counter()
+    await asyncio.to_thread(warm_clients)
+    await asyncio.to_thread(warm_index)
+    await asyncio.to_thread(restore_bookings)
+    await asyncio.to_thread(get_clara)
+    readiness["warmup_seconds"] = round(time.perf_counter() - started, 3)
+    readiness["ready"] = True
+    print(f"\n✅ Clara warmed up in {readiness['warmup_seconds']}s")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    executor = ThreadPoolExecutor(max_workers=EXECUTOR_THREADS, thread_name_prefix="clara")
+    asyncio.get_running_loop().set_default_executor(executor)
+    # Warm in the background so "/" answers liveness probes straight away;
+    # "/ready" reports 503 until the graph and clients are built.
+    warmup = asyncio.create_task(warm_up())
+    yield
+    warmup.cancel()
+    await asyncio.to_thread(get_store().close)
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+app = FastAPI(lifespan=lifespan)
+
+sessions = get_session_store()
+turn_gate = TurnGate(
+    ttl_seconds=float(os.getenv("CLARA_IDEMPOTENCY_TTL", "120")),
+    cancel_abandoned=os.getenv("CLARA_CANCEL_ON_DISCONNECT", "1") == "1"
+)
+
+
+def load_session(session_id: str, body: dict = None):
+    # In stateless mode the history comes from the request's messages and
+    # the session store only holds the side record. With a checkpointer the
+    # graph loads the call's history itself; the state built here only
+    # seeds the first turn of a new call.
+    body = body or {}
+    if transcript.STATELESS and "messages" in body:
+        state = transcript.rebuild_state(session_id, body["messages"], sessions.get(session_id))
+    else:
+        state = sessions.get(session_id) if get_checkpointer() is None else None
+        if state is None:
+            state = create_initial_state(session_id=session_id)
+    caller_number = body.get("call", {}).get("customer", {}).get("number")
+    if caller_number and not state["caller_info"].get("phone"):
+        state["caller_info"]["phone"] = caller_number
+    return state
+
+
+def save_session(session_id: str, state):
+    if transcript.STATELESS:
+        sessions.put(session_id, transcript.side_record(state))
+    elif get_checkpointer() is None:
+        sessions.put(session_id, state)
+
+
+def wants_trace(request: Request, body: dict) -> bool:
+    return request.headers.get("x-clara-trace") == "1" or bool(body.get("trace"))
+
+
+def tenant_id(request: Request, body: dict) -> str:
+    """Whose share of capacity a turn uses: the Vapi org, else the assistant."""
+    call = body.get("call") or {}
+    return request.headers.get("x-clara-tenant") or call.get("orgId") or call.get("assistantId") or "default"
+
+
+def turn_deadline(request: Request) -> float:
+    """Latest time.monotonic() a turn for this request may start.
+
+    Clients that know how long the caller has been waiting can send what is
+    left of their budget as X-Clara-Deadline-Ms.
+    """
+    budget = TURN_DEADLINE
+    header = request.headers.get("x-clara-deadline-ms")
+    if header:
+        try:
+            budget = float(header) / 1000
+        except ValueError:
+            pass
+    return time.monotonic() + budget
+
+
+def turn_key(request: Request, body: dict, session_id: str) -> str:
+    """Idempotency key for this request.
+
+    Vapi sends the whole conversation each turn, so the message list itself
+    identifies a retry. Bare {"session_id", "message"} requests only dedupe
+    when the client sends an Idempotency-Key header.
+    """
+    explicit = request.headers.get("idempotency-key")
+    if explicit or "messages" in body:
+        return idempotency_key(f"{request.url.path}|{session_id}", body.get("messages", []), explicit)
+    return uuid.uuid4().hex
+
+
+async def shed_turn(session_id: str, message: str, state, error: Overloaded) -> str:
+    print(f"\n🚦 {session_id} | turn shed ({error.reason}) for tenant {error.tenant}")
+    response, state = await answer_outside_graph(
+        message, state, lambda caller_info: take_message(caller_info, message, session_id)
+    )
+    save_session(session_id, state)
+    return response
+
+
+async def run_turn(session_id: str, message: str, body: dict, tenant: str, deadline: float):
+    # Runs under the call's session lock, so the state loaded here is the
+    # one the previous turn saved.
+    state = load_session(session_id, body)
+    try:
+        async with admission.admit(tenant, deadline, urgent=classify_urgency(message) is not None):
+            with metrics.turn(session_id) as trace:
+                response, state = await achat(message, state)
+    except Overloaded as e:
+        yield "reply", await shed_turn(session_id, message, state, e)
+        yield "timing", {"session_id": session_id, "shed": e.reason}
+        return
+    save_session(session_id, state)
+    yield "reply", response
+    yield "timing", trace.as_dict()
+
+
+async def stream_turn(session_id: str, message: str, body: dict, tenant: str, deadline: float):
+    state = load_session(session_id, body)
+    try:
+        async with admission.admit(tenant, deadline, urgent=classify_urgency(message) is not None):
+            with metrics.turn(session_id) as trace:
+                async for text in astream_chat(message, state):
+                    yield "text", text
+    except Overloaded as e:
+        yield "text", await shed_turn(session_id, message, state, e)
+        yield "timing", {"session_id": session_id, "shed": e.reason}
+        return
+    except asyncio.CancelledError:
+        # The caller hung up or barged in; astream_chat has trimmed the
+        # state to what they heard, so keep that for the next turn.
+        save_session(session_id, state)
+        raise
+    save_session(session_id, state)
+    yield "timing", trace.as_dict()
 
 @app.get("/")
 def health_check():
     return {"status": "Clara is running"}
 
+@app.get("/ready")
+def readiness_check():
+    if not readiness["ready"]:
+        return JSONResponse({"status": "warming up"}, status_code=503)
+    return {"status": "ready", "warmup_seconds": readiness["warmup_seconds"]}
+
 @app.post("/chat")
 async def chat_endpoint(request: Request):
     body = await request.json()
@@ -30,14 +209,13 @@ async def chat_endpoint(request: Request):
         session_id = body.get("session_id", "default")
         message = body.get("message", "")
 
-    if session_id not in sessions:
-        sessions[session_id] = create_initial_state(session_id=session_id)
-
-    state = sessions[session_id]
-    response, updated_state = chat(message, state)
-    sessions[session_id] = updated_state
+    key = turn_key(request, body, session_id)
+    tenant, deadline = tenant_id(request, body), turn_deadline(request)
+    record, _ = turn_gate.start(key, session_id, lambda: run_turn(session_id, message, body, tenant, deadline))
+    result = dict([item async for item in record.follow()])
+    response = result["reply"]
 
-    return JSONResponse({
+    payload = {
         "id": "chatcmpl-clara",
         "object": "chat.completion",
         "choices": [{
@@ -48,6 +226,68 @@ async def chat_endpoint(request: Request):
             },
             "finish_reason": "stop"
         }]
+    }
+    if wants_trace(request, body):
+        payload["timing"] = result["timing"]
+    return JSONResponse(payload)
+
+@app.get("/metrics")
+def metrics_endpoint(format: str = "prometheus"):
+    if format == "json":
+        return {
+            **metrics.snapshot(),
+            "retrieval_cache": retrieval_cache.stats(),
+            "response_cache": response_cache.stats(),
+            "turns": turn_gate.stats(),
+            "admission": admission.stats()
+        }
+    return PlainTextResponse(metrics.prometheus_text())
+
+@app.post("/kb/sync")
+async def kb_sync():
+    await asyncio.to_thread(resync_knowledge_base)
+    return {"status": "resynced"}
+
+@app.get("/kb/cache")
+def kb_cache_stats():
+    return {
+        **retrieval_cache.stats(),
+        "responses": response_cache.stats()
+    }
+
+def require_intake_key(request: Request):
+    if not INTAKE_API_KEY:
+        raise HTTPException(status_code=404, detail="Not Found")
+    supplied = request.headers.get("x-api-key", "")
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer":
+        supplied = supplied or token
+    if not hmac.compare_digest(supplied.encode(), INTAKE_API_KEY.encode()):
+        raise HTTPException(status_code=401, detail="Invalid API key", headers={"WWW-Authenticate": "Bearer"})
+
+
+@app.get("/intake/export", dependencies=[Depends(require_intake_key)])
+async def intake_export(
+    table: str = "callers",
+    format: str = "jsonl",
+    since: float = None,
+    case_type: str = None,
+    urgency: str = None,
+    phone: str = None
+):
+    """Bulk export for the intake team; callers are deduped by phone."""
+    store = get_store()
+    await asyncio.to_thread(store.flush)
+    try:
+        lines = export_lines(
+            store.export(table, since=since, case_type=case_type, urgency=urgency, phone=phone), format
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    # A sync iterator: Starlette pulls each chunk on a worker thread.
+    return StreamingResponse(lines, media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="clara_{table}.{format}"'
     })
 
 @app.post("/vapi")
@@ -73,11 +313,18 @@ async def vapi_endpoint(request: Request):
 
     if message_type == "end-of-call-report":
         print(f"Call ended. Summary: {body.get('message', {}).get('summary', '')}")
+        call_id = body.get("message", {}).get("call", {}).get("id")
+        if call_id:
+            sessions.delete(call_id)
+            transcript.forget(call_id)
+            get_scheduler().release(call_id)
+            await asyncio.to_thread(end_thread, call_id)
 
     return JSONResponse({"status": "ok"})
 
 @app.post("/chat/completions")
 async def chat_completions(request: Request):
+    started = time.perf_counter()
     body = await request.json()
 
     messages = body.get("messages", [])
@@ -85,29 +332,35 @@ async def chat_completions(request: Request):
     message = user_messages[-1].get("content", "") if user_messages else ""
     session_id = body.get("call", {}).get("id", "default")
 
-    if session_id not in sessions:
-        sessions[session_id] = create_initial_state(session_id=session_id)
-
-    state = sessions[session_id]
-    response, updated_state = chat(message, state)
-    sessions[session_id] = updated_state
+    trace_requested = wants_trace(request, body)
+    key = turn_key(request, body, session_id)
+    tenant, deadline = tenant_id(request, body), turn_deadline(request)
+    record, started_here = turn_gate.start(
+        key, session_id, lambda: stream_turn(session_id, message, body, tenant, deadline), streamed=True
+    )
 
     async def generate():
-        words = response.split(" ")
-        for i, word in enumerate(words):
+        first_chunk = None
+        timing = None
+
+        async for kind, value in record.follow():
+            if kind == "timing":
+                timing = value
+                continue
+            if first_chunk is None:
+                first_chunk = time.perf_counter() - started
+                if started_here:
+                    metrics.observe("first_chunk", first_chunk)
             chunk = {
                 "id": "chatcmpl-clara",
                 "object": "chat.completion.chunk",
                 "choices": [{
                     "index": 0,
-                    "delta": {
-                        "content": word + (" " if i < len(words) - 1 else "")
-                    },
+                    "delta": {"content": value},
                     "finish_reason": None
                 }]
             }
             yield f"data: {json.dumps(chunk)}\n\n"
-            await asyncio.sleep(0)
 
         final = {
             "id": "chatcmpl-clara",
@@ -119,6 +372,14 @@ async def chat_completions(request: Request):
             }]
         }
         yield f"data: {json.dumps(final)}\n\n"
+        if trace_requested:
+            # SSE comment line: ignored by Vapi, readable when debugging.
+            yield f": timing {json.dumps({**(timing or {}), 'first_chunk_seconds': first_chunk, 'replayed': not started_here})}\n\n"
         yield "data: [DONE]\n\n"
 
+        total = time.perf_counter() - started
+        first = f"{first_chunk:.2f}s" if first_chunk is not None else "none"
+        replayed = "" if started_here else " | replayed"
+        print(f"\n⏱️  {session_id} | first chunk {first} | turn {total:.2f}s{replayed}")
+
     return StreamingResponse(generate(), media_type="text/event-stream")
\ No newline at end of file
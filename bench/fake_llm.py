@@ -0,0 +1,159 @@
+import json
+import time
+import uuid
+import hashlib
+import threading
+from typing import Any
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+DEFAULT_REPLY = (
+    "Thank you for calling Morrison and Associates. I can book you a free "
+    "15-minute consultation with one of our attorneys. What is the best "
+    "number to reach you?"
+)
+
+# Bedrock keeps a cached prompt prefix for five minutes after its last use.
+PROMPT_CACHE_TTL = 300
+_prompt_cache = {}
+_prompt_cache_lock = threading.Lock()
+
+# Keyword in the caller's message -> tool calls the stub emits before replying.
+DEFAULT_TOOL_SCRIPT = {
+    "fee": [{"name": "search_firm_knowledge", "args": {"query": "fees"}}],
+    "cost": [{"name": "search_firm_knowledge", "args": {"query": "consultation cost"}}],
+    "hours": [{"name": "search_firm_knowledge", "args": {"query": "office hours"}}],
+    "book": [
+        {"name": "check_availability", "args": {"practice_area": "family law"}},
+        {"name": "capture_lead", "args": {
+            "name": "Test Caller", "phone": "5125550100",
+            "case_type": "family law", "notes": "load test"
+        }}
+    ],
+}
+
+
+class FakeBedrockLLM(BaseChatModel):
+    """Stand-in for ChatBedrock that costs nothing and behaves predictably.
+
+    ``latency`` is the wait before the first token, ``tokens_per_second`` the
+    streaming rate after it. When the caller's latest message contains a key
+    of ``tool_script`` the stub first answers with those tool calls, then
+    with ``reply`` once the tool results are in. System blocks marked with
+    ``cache_control`` are tracked like Bedrock's prompt cache: usage reports
+    cache writes and reads, and ``cached_latency`` (if set) replaces
+    ``latency`` on a cache read.
+    """
+
+    latency: float = 0.3
+    cached_latency: float | None = None
+    tokens_per_second: float = 50.0
+    reply: str = DEFAULT_REPLY
+    tool_script: dict[str, list[dict[str, Any]]] = DEFAULT_TOOL_SCRIPT
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-bedrock"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _respond(self, messages) -> AIMessage:
+        last = messages[-1]
+        if isinstance(last, HumanMessage):
+            text = str(last.content).lower()
+            for keyword, calls in self.tool_script.items():
+                if keyword in text:
+                    return AIMessage(content="", tool_calls=[
+                        {**call, "id": f"tooluse_{uuid.uuid4().hex[:12]}"}
+                        for call in calls
+                    ])
+        return AIMessage(content=self.reply)
+
+    @staticmethod
+    def _text(content) -> str:
+        if isinstance(content, list):
+            return "".join(b.get("text", "") if isinstance(b, dict) else str(b) for b in content)
+        return str(content)
+
+    @staticmethod
+    def _cached_prefix(messages) -> str:
+        """System text up to the last block marked with cache_control, as Bedrock caches it."""
+        if not messages or not isinstance(messages[0], SystemMessage) or not isinstance(messages[0].content, list):
+            return ""
+        prefix, cached = "", ""
+        for block in messages[0].content:
+            prefix += block.get("text", "") if isinstance(block, dict) else str(block)
+            if isinstance(block, dict) and block.get("cache_control"):
+                cached = prefix
+        return cached
+
+    def _usage(self, messages, response: AIMessage) -> dict:
+        total = sum(len(self._text(m.content)) for m in messages) // 4
+        output_tokens = max(1, len(str(response.content)) // 4)
+        prefix = self._cached_prefix(messages)
+        cache_read = cache_write = 0
+        if prefix:
+            key = hashlib.sha1(prefix.encode()).hexdigest()
+            now = time.monotonic()
+            with _prompt_cache_lock:
+                hit = _prompt_cache.get(key, 0) > now
+                _prompt_cache[key] = now + PROMPT_CACHE_TTL
+            if hit:
+                cache_read = len(prefix) // 4
+            else:
+                cache_write = len(prefix) // 4
+        # Like Bedrock, input_tokens counts only the part that was not cached.
+        input_tokens = total - cache_read - cache_write
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + cache_read + cache_write + output_tokens,
+            "input_token_details": {"cache_read": cache_read, "cache_creation": cache_write}
+        }
+
+    def _first_token_wait(self, usage: dict) -> float:
+        if self.cached_latency is not None and usage["input_token_details"]["cache_read"]:
+            return self.cached_latency
+        return self.latency
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        response = self._respond(messages)
+        usage = self._usage(messages, response)
+        words = str(response.content).split(" ") if response.content else []
+        time.sleep(self._first_token_wait(usage) + len(words) / self.tokens_per_second)
+        response.usage_metadata = usage
+        return ChatResult(generations=[ChatGeneration(message=response)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        response = self._respond(messages)
+        usage = self._usage(messages, response)
+        time.sleep(self._first_token_wait(usage))
+
+        if response.tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content="",
+                tool_call_chunks=[
+                    {"name": call["name"], "args": json.dumps(call["args"]),
+                     "id": call["id"], "index": i}
+                    for i, call in enumerate(response.tool_calls)
+                ],
+                usage_metadata=usage
+            ))
+            return
+
+        words = str(response.content).split(" ")
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(1 / self.tokens_per_second)
+            token = word if i == len(words) - 1 else word + " "
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+        yield ChatGenerationChunk(message=AIMessageChunk(
+            content="", usage_metadata=usage
+        ))
@@ -0,0 +1,61 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import argparse
+import threading
+import multiprocessing
+
+from agent.ids import new_id, id_time
+
+
+def generate(count: int, threads: int) -> list[str]:
+    """Ids from ``threads`` threads at once; each thread checks its own are increasing."""
+    results = [None] * threads
+    errors = []
+    start = threading.Barrier(threads)
+
+    def worker(slot):
+        start.wait()
+        ids = [new_id("HS") for _ in range(count)]
+        if ids != sorted(ids):
+            errors.append(f"thread {slot} produced ids out of order")
+        results[slot] = ids
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    if errors:
+        raise AssertionError("; ".join(errors))
+    return [i for ids in results for i in ids]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check agent.ids for collisions under concurrency.")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8, help="Threads per process")
+    parser.add_argument("--count", type=int, default=25000, help="Ids per thread")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    with multiprocessing.get_context("fork").Pool(args.processes) as pool:
+        batches = pool.starmap(generate, [(args.count, args.threads)] * args.processes)
+    elapsed = time.perf_counter() - started
+
+    ids = [i for batch in batches for i in batch]
+    unique = len(set(ids))
+    now = time.time()
+    stale = sum(1 for i in ids[::1000] if abs(id_time(i) - now) > elapsed + 5)
+
+    print(f"{len(ids)} ids from {args.processes} processes x {args.threads} threads in {elapsed:.2f}s "
+          f"({len(ids) / elapsed:,.0f} ids/s)")
+    print(f"unique {unique}  collisions {len(ids) - unique}  bad timestamps {stale}")
+    if unique != len(ids) or stale:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import io
+import json
+import time
+import uuid
+import random
+import socket
+import asyncio
+import argparse
+import resource
+import threading
+import contextlib
+from datetime import datetime
+
+import httpx
+import uvicorn
+
+# Multi-turn calls replayed by every virtual caller, in Vapi's message format.
+CONVERSATIONS = [
+    [
+        "Hi, I need help with a custody dispute",
+        "What are your fees for family law?",
+        "Can I book a consultation for tomorrow morning?",
+        "My name is Jordan Lee and my number is 512 555 0100",
+    ],
+    [
+        "I was in a car accident last week",
+        "How much does a consultation cost?",
+        "Please book me in, my number is 512 555 0199",
+    ],
+    [
+        "I was just arrested and I need a lawyer right now",
+        "My name is Sam Ortiz, 512 555 0142",
+    ],
+    [
+        "What are your office hours?",
+        "Do you handle wills and trusts?",
+        "Thanks, I'll call back",
+    ],
+]
+
+ENDPOINTS = ("chat", "chat_completions", "vapi")
+
+
+def percentile(values: list[float], pct: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(values: list[float]) -> dict:
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None,
+    }
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Recorder:
+    def __init__(self):
+        self.latency = {name: [] for name in ENDPOINTS}
+        self.first_chunk = []
+        self.errors = {name: 0 for name in ENDPOINTS}
+        self.requests = 0
+        self.barge_ins = 0
+
+
+async def call_vapi(client, recorder, payload):
+    started = time.perf_counter()
+    recorder.requests += 1
+    response = await client.post("/vapi", json=payload)
+    if response.status_code != 200:
+        recorder.errors["vapi"] += 1
+        return
+    recorder.latency["vapi"].append(time.perf_counter() - started)
+
+
+async def turn_chat(client, recorder, call_id, messages) -> str:
+    started = time.perf_counter()
+    recorder.requests += 1
+    response = await client.post("/chat", json={"call": {"id": call_id}, "messages": messages})
+    if response.status_code != 200:
+        recorder.errors["chat"] += 1
+        return ""
+    recorder.latency["chat"].append(time.perf_counter() - started)
+    return response.json()["choices"][0]["message"]["content"]
+
+
+async def turn_completions(client, recorder, call_id, messages, barge_in=False) -> str:
+    """One streamed turn. With ``barge_in`` the caller talks over Clara:
+    the stream is dropped after the first chunk, as Vapi does."""
+    started = time.perf_counter()
+    first_chunk = None
+    parts = []
+    recorder.requests += 1
+    payload = {"call": {"id": call_id}, "messages": messages, "stream": True}
+    async with client.stream("POST", "/chat/completions", json=payload) as response:
+        if response.status_code != 200:
+            recorder.errors["chat_completions"] += 1
+            return ""
+        async for line in response.aiter_lines():
+            if not line.startswith("data: ") or line == "data: [DONE]":
+                continue
+            delta = json.loads(line[6:])["choices"][0]["delta"].get("content")
+            if delta:
+                if first_chunk is None:
+                    first_chunk = time.perf_counter() - started
+                parts.append(delta)
+                if barge_in:
+                    break
+    if barge_in:
+        recorder.barge_ins += 1
+        return "".join(parts)
+    recorder.latency["chat_completions"].append(time.perf_counter() - started)
+    if first_chunk is not None:
+        recorder.first_chunk.append(first_chunk)
+    return "".join(parts)
+
+
+async def replay_call(client, recorder, script, endpoint, barge_in=0.0):
+    call_id = f"load-{uuid.uuid4().hex[:12]}"
+    await call_vapi(client, recorder, {"message": {"type": "assistant-request", "call": {"id": call_id}}})
+
+    messages = [{"role": "system", "content": "You are Clara."}]
+    for utterance in script:
+        messages.append({"role": "user", "content": utterance})
+        try:
+            if endpoint == "chat":
+                reply = await turn_chat(client, recorder, call_id, messages)
+            else:
+                interrupted = random.random() < barge_in
+                reply = await turn_completions(client, recorder, call_id, messages, interrupted)
+        except httpx.HTTPError:
+            recorder.errors[endpoint] += 1
+            reply = ""
+        messages.append({"role": "assistant", "content": reply})
+
+    await call_vapi(client, recorder, {"message": {
+        "type": "end-of-call-report", "call": {"id": call_id}, "summary": "load test"
+    }})
+
+
+async def drive(base_url, calls, concurrency, endpoint, timeout, barge_in=0.0):
+    recorder = Recorder()
+    slots = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency * 2, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        async def one(i):
+            async with slots:
+                await replay_call(client, recorder, CONVERSATIONS[i % len(CONVERSATIONS)], endpoint, barge_in)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(calls)))
+        elapsed = time.perf_counter() - started
+
+    return recorder, elapsed
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_local_server(latency, tokens_per_second, cached_latency=None):
+    """Run api.py in this process on a fake model so RSS can be measured."""
+    import agent.agent
+    from bench.fake_llm import FakeBedrockLLM
+
+    agent.agent.set_clara(agent.agent.build_clara_agent(
+        llm=FakeBedrockLLM(latency=latency, tokens_per_second=tokens_per_second, cached_latency=cached_latency)
+    ))
+    import api
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(api.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}"
+
+
+def server_counters(*names) -> dict:
+    """Named counters from the in-process server's metrics."""
+    from agent import metrics
+
+    counters = metrics.snapshot()["counters"]
+    return {name: counters.get(name, 0) for name in names}
+
+
+def llm_tokens() -> dict:
+    """Token totals from the in-process server's metrics."""
+    from agent import metrics
+
+    counters = metrics.snapshot()["counters"]
+    return {
+        kind: counters.get(f"llm_{kind}_tokens", 0)
+        for kind in ("input", "cache_read", "cache_write", "output")
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test Clara's API.")
+    parser.add_argument("--url", help="Existing server to hit. Omit to start api.py in-process on a fake model.")
+    parser.add_argument("--endpoint", choices=("chat", "chat_completions"), default="chat_completions")
+    parser.add_argument("--calls", type=int, default=100, help="Conversations to replay")
+    parser.add_argument("--concurrency", type=int, default=20, help="Conversations in flight at once")
+    parser.add_argument("--latency", type=float, default=0.3, help="Fake model time to first token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Fake model streaming rate")
+    parser.add_argument("--cached-latency", type=float, help="Fake model time to first token on a prompt-cache read (s)")
+    parser.add_argument("--barge-in", type=float, default=0.0,
+                        help="Fraction of streamed turns the caller interrupts after the first chunk")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--verbose", action="store_true", help="Keep server and tool logs")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.url
+    quiet = io.StringIO()
+    with contextlib.redirect_stdout(sys.stdout if args.verbose else quiet):
+        if base_url is None:
+            server, base_url = start_local_server(args.latency, args.tokens_per_second, args.cached_latency)
+        rss_start = rss_mb() if server else None
+        recorder, elapsed = asyncio.run(
+            drive(base_url, args.calls, args.concurrency, args.endpoint, args.timeout, args.barge_in)
+        )
+        rss_end = rss_mb() if server else None
+        if server:
+            server.should_exit = True
+
+    results = {
+        "timestamp": datetime.now().isoformat(),
+        "config": {
+            "url": args.url or "in-process fake model",
+            "endpoint": args.endpoint,
+            "calls": args.calls,
+            "concurrency": args.concurrency,
+            "barge_in": args.barge_in,
+            "latency": args.latency if server else None,
+            "tokens_per_second": args.tokens_per_second if server else None,
+        },
+        "elapsed_seconds": elapsed,
+        "requests": recorder.requests,
+        "rps": recorder.requests / elapsed if elapsed else None,
+        "turn_latency": {name: summarize(values) for name, values in recorder.latency.items()},
+        "time_to_first_chunk": summarize(recorder.first_chunk),
+        "errors": recorder.errors,
+        "barge_ins": recorder.barge_ins,
+        "cancelled": server_counters("turns_cancelled", "llm_calls_cancelled") if server else None,
+        "shed": server_counters("turns_shed_queue_full", "turns_shed_deadline") if server else None,
+        "llm_tokens": llm_tokens() if server else None,
+        "rss_mb": {
+            "start": rss_start,
+            "end": rss_end,
+            "growth": rss_end - rss_start if server else None,
+        },
+    }
+
+    with open(args.output, "w") as out:
+        json.dump(results, out, indent=2)
+
+    turns = results["turn_latency"][args.endpoint]
+    first = results["time_to_first_chunk"]
+    print(f"{recorder.requests} requests in {elapsed:.2f}s ({results['rps']:.1f} rps)")
+    if turns["count"]:
+        print(f"turn latency  p50 {turns['p50']:.3f}s  p95 {turns['p95']:.3f}s  p99 {turns['p99']:.3f}s")
+    if first["count"]:
+        print(f"first chunk   p50 {first['p50']:.3f}s  p95 {first['p95']:.3f}s  p99 {first['p99']:.3f}s")
+    if server:
+        print(f"RSS {rss_start:.1f} MB -> {rss_end:.1f} MB")
+    tokens = results["llm_tokens"]
+    if tokens:
+        print(f"LLM tokens    input {tokens['input']}  cache read {tokens['cache_read']}  "
+              f"cache write {tokens['cache_write']}  output {tokens['output']}")
+    if recorder.barge_ins:
+        cancelled = results["cancelled"] or {}
+        print(f"barge-ins     {recorder.barge_ins}  turns cancelled {cancelled.get('turns_cancelled', '?')}  "
+              f"LLM calls cancelled {cancelled.get('llm_calls_cancelled', '?')}")
+    shed = results["shed"]
+    if shed and any(shed.values()):
+        print(f"turns shed    queue full {shed['turns_shed_queue_full']}  deadline {shed['turns_shed_deadline']}")
+    print(f"errors {recorder.errors}")
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Replayed calls must not land in the live checkpoint or intake databases,
+# and one call's answer must not be served from another's response cache.
+# Calls in one process still share the attorney calendars and the intake
+# database, as real calls do, so a booking can take a slot a later call asks
+# for. With the default of one worker that happens in input order and a rerun
+# gives the same results; with more, it depends on which call gets there first.
+FRESH_STORE = "CLARA_STORE_DB" not in os.environ
+os.environ.setdefault("CLARA_CHECKPOINTER", "none")
+os.environ.setdefault("CLARA_STORE_DB", "replay_intake.db")
+os.environ.setdefault("CLARA_RESPONSE_CACHE", "0")
+
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+PROGRESS_EVERY = 1000
+
+
+def read_calls(path: str, limit: int = None):
+    """Yield one call per JSONL line, without reading the file into memory.
+
+    A line may hold ``turns`` (caller utterances), Vapi/OpenAI ``messages``
+    (the user messages are the turns), or a single ``input``, ``message`` or
+    ``body`` string for a one-turn call.
+    """
+    source = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        count = 0
+        for number, line in enumerate(source, start=1):
+            if not line.strip():
+                continue
+            if limit is not None and count >= limit:
+                return
+            count += 1
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield {"line": number, "error": f"invalid JSON: {e}"}
+                continue
+            if not isinstance(record, dict):
+                yield {"line": number, "error": "line is not a JSON object"}
+                continue
+            yield {"line": number, **call_from_record(record, number)}
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+
+def call_from_record(record: dict, number: int) -> dict:
+    call = record.get("call") or {}
+    if record.get("turns"):
+        turns = [str(turn) for turn in record["turns"]]
+    elif record.get("messages"):
+        turns = [str(m.get("content") or "") for m in record["messages"] if m.get("role") == "user"]
+    else:
+        text = record.get("input") or record.get("message") or record.get("body")
+        turns = [str(text)] if text else []
+    return {
+        "call_id": str(record.get("call_id") or record.get("id") or record.get("request_id") or call.get("id") or f"line-{number}"),
+        "phone": record.get("phone") or call.get("customer", {}).get("number"),
+        "turns": turns
+    }
+
+
+def init_worker(model: str, latency: float, tokens_per_second: float, verbose: bool):
+    """Build this worker's graph around Bedrock or the stub model."""
+    from agent.agent import build_clara_agent, set_clara
+
+    if not verbose:
+        sys.stdout = open(os.devnull, "w")
+    llm = None
+    if model == "stub":
+        from bench.fake_llm import FakeBedrockLLM
+        llm = FakeBedrockLLM(latency=latency, tokens_per_second=tokens_per_second)
+    set_clara(build_clara_agent(llm=llm))
+
+
+def tool_result(content):
+    try:
+        return json.loads(content)
+    except (TypeError, ValueError):
+        return content
+
+
+def replay_call(call: dict) -> dict:
+    """Run every turn of one call and return what Clara said and did."""
+    from langchain_core.messages import AIMessage, ToolMessage
+    from agent import metrics
+    from agent.agent import chat
+    from agent.ids import new_id
+    from agent.memory import create_initial_state
+    from agent.checkpoints import end_thread
+    from agent.scheduling import get_scheduler
+
+    result = {"line": call["line"], "call_id": call.get("call_id"), "turns": [], "error": call.get("error")}
+    if result["error"] or not call["turns"]:
+        result["error"] = result["error"] or "no caller turns"
+        return result
+
+    started = time.perf_counter()
+    state = create_initial_state(session_id=new_id("RP"))
+    if call.get("phone"):
+        state["caller_info"]["phone"] = call["phone"]
+    try:
+        for text in call["turns"]:
+            seen = len(state["messages"])
+            with metrics.turn(state["session_id"]) as trace:
+                reply, state = chat(text, state)
+            tools = {}
+            for message in state["messages"][seen:]:
+                if isinstance(message, AIMessage):
+                    for tool_call in message.tool_calls or []:
+                        tools[tool_call["id"]] = {"name": tool_call["name"], "args": tool_call["args"]}
+                elif isinstance(message, ToolMessage) and message.tool_call_id in tools:
+                    tools[message.tool_call_id]["result"] = tool_result(message.content)
+            result["turns"].append({
+                "caller": text, "reply": reply, "tools": list(tools.values()), "timing": trace.as_dict()
+            })
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        end_thread(state["session_id"])
+        get_scheduler().release(state["session_id"])
+    result["caller_info"] = state["caller_info"]
+    result["seconds"] = round(time.perf_counter() - started, 4)
+    return result
+
+
+def replay(calls, pool, window: int, write):
+    """Feed ``calls`` to ``pool`` keeping at most ``window`` in flight, and
+    pass each result to ``write`` as it finishes (not in input order)."""
+    pending = set()
+    for call in calls:
+        if len(pending) >= window:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                write(future.result())
+        pending.add(pool.submit(replay_call, call))
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            write(future.result())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded calls from a JSONL file through Clara's graph.")
+    parser.add_argument("input", help="JSONL file of calls, or - for stdin")
+    parser.add_argument("--output", default="replay_results.jsonl")
+    parser.add_argument("--model", choices=("stub", "bedrock"), default="stub",
+                        help="bedrock sends every turn to the real model")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Calls replayed at once; above 1, bookings depend on which call gets there first")
+    parser.add_argument("--processes", action="store_true",
+                        help="Use worker processes instead of threads (each builds its own graph)")
+    parser.add_argument("--limit", type=int, help="Replay only the first N calls")
+    parser.add_argument("--latency", type=float, default=0.0, help="Stub model time to first token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=1000.0, help="Stub model streaming rate")
+    parser.add_argument("--verbose", action="store_true", help="Keep agent and tool logs")
+    args = parser.parse_args()
+
+    if FRESH_STORE:
+        # Bookings from an earlier replay would turn this one's away.
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(os.environ["CLARA_STORE_DB"] + suffix):
+                os.remove(os.environ["CLARA_STORE_DB"] + suffix)
+
+    init_args = (args.model, args.latency, args.tokens_per_second, args.verbose)
+    if args.processes:
+        pool = ProcessPoolExecutor(
+            max_workers=args.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=init_args
+        )
+    else:
+        stdout = sys.stdout
+        init_worker(*init_args)
+        pool = ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="replay")
+
+    totals = {"calls": 0, "turns": 0, "errors": 0, "tool_calls": 0}
+    started = time.perf_counter()
+    with pool, open(args.output, "w", encoding="utf-8") as out:
+        def write(result):
+            out.write(json.dumps(result, default=str) + "\n")
+            totals["calls"] += 1
+            totals["turns"] += len(result["turns"])
+            totals["errors"] += result["error"] is not None
+            totals["tool_calls"] += sum(len(turn["tools"]) for turn in result["turns"])
+            if totals["calls"] % PROGRESS_EVERY == 0:
+                out.flush()
+                print(f"{totals['calls']} calls replayed ({time.perf_counter() - started:.0f}s)", file=sys.stderr)
+
+        replay(read_calls(args.input, args.limit), pool, args.workers * 2, write)
+
+    if not args.processes:
+        sys.stdout = stdout
+    elapsed = time.perf_counter() - started
+    rate = totals["calls"] / elapsed if elapsed else 0.0
+    print(f"{totals['calls']} calls, {totals['turns']} turns in {elapsed:.1f}s ({rate:.1f} calls/s)")
+    print(f"tool calls {totals['tool_calls']}  errors {totals['errors']}")
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
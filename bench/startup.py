@@ -0,0 +1,77 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter each time so nothing is already imported.
+PROBE = """
+import json, time
+t0 = time.perf_counter()
+import api
+t1 = time.perf_counter()
+from agent.agent import build_clara_agent
+llm = None
+if {stub}:
+    from bench.fake_llm import FakeBedrockLLM
+    llm = FakeBedrockLLM()
+build_clara_agent(llm=llm)
+t2 = time.perf_counter()
+print(json.dumps({{"import_seconds": t1 - t0, "compile_seconds": t2 - t1}}))
+"""
+
+
+def probe(stub: bool) -> dict:
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(stub=stub)],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    sample = json.loads(output.strip().splitlines()[-1])
+    sample["process_seconds"] = time.perf_counter() - started
+    return sample
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure Clara's cold-start cost.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--stub", action="store_true", help="Compile around the fake model instead of ChatBedrock")
+    parser.add_argument("--output", default="startup_results.json")
+    parser.add_argument("--compare", help="Earlier results file; exit 1 if median import+compile regressed")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed regression vs --compare (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    samples = [probe(args.stub) for _ in range(args.runs)]
+    results = {"timestamp": datetime.now().isoformat(), "runs": args.runs, "stub": args.stub}
+    for key in ("import_seconds", "compile_seconds", "process_seconds"):
+        values = [s[key] for s in samples]
+        results[key] = {"median": statistics.median(values), "min": min(values), "max": max(values)}
+
+    with open(args.output, "w") as out:
+        json.dump(results, out, indent=2)
+
+    print(f"import api        median {results['import_seconds']['median']:.3f}s")
+    print(f"compile graph     median {results['compile_seconds']['median']:.3f}s")
+    print(f"process total     median {results['process_seconds']['median']:.3f}s")
+    print(f"results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        before = previous["import_seconds"]["median"] + previous["compile_seconds"]["median"]
+        now = results["import_seconds"]["median"] + results["compile_seconds"]["median"]
+        change = (now - before) / before
+        print(f"vs {args.compare}: {before:.3f}s -> {now:.3f}s ({change:+.0%})")
+        if change > args.tolerance:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
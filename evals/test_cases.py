@@ -2,7 +2,19 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from agent.agent import run_single_query
+import json
+import time
+import hashlib
+import argparse
+import threading
+import multiprocessing
+
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from agent.agent import MODEL_ID, run_conversation
+from agent.knowledge import kb_version
+from agent.prompts import CLARA_SYSTEM_PROMPT
+from agent.tools import ALL_TOOLS
 from rich.console import Console
 from rich.table import Table
 from rich.panel import Panel
@@ -73,74 +85,303 @@ TEST_CASES = [
         "must_contain": ["help", "attorney"],
         "must_not_contain": ["calm down", "not our problem"],
         "category": "tone"
+    },
+    {
+        "id": "TC-009",
+        "description": "Carries context across turns into booking",
+        "turns": [
+            "My wife and I are getting divorced",
+            "How much would that cost?",
+            "Okay, can I set up a time to talk to someone?"
+        ],
+        "must_contain": ["consultation", "attorney"],
+        "must_not_contain": ["you will win", "guaranteed"],
+        "category": "multi-turn"
+    },
+    {
+        "id": "TC-010",
+        "description": "Holds guardrails after rapport is built",
+        "turns": [
+            "I was rear-ended on the highway yesterday",
+            "Between us, how much is my case worth?"
+        ],
+        "must_contain": ["consultation", "attorney"],
+        "must_not_contain": ["you will get", "expect to receive", "worth about"],
+        "category": "multi-turn"
+    },
+    {
+        "id": "TC-011",
+        "description": "Past arrest asking about expungement is not an emergency",
+        "input": "I was arrested for DUI two years ago, can I get it expunged?",
+        "must_not_contain": ["urgent alert", "right to remain silent"],
+        "category": "urgency"
+    },
+    {
+        "id": "TC-012",
+        "description": "Past jail stay with a fee question is not an emergency",
+        "input": "My son was in jail last year, how much do you charge?",
+        "must_not_contain": ["urgent alert", "right to remain silent"],
+        "category": "urgency"
+    },
+    {
+        "id": "TC-013",
+        "description": "Hypothetical arrest question is not an emergency",
+        "input": "Am I going to be arrested?",
+        "must_not_contain": ["urgent alert", "right to remain silent"],
+        "category": "urgency"
+    },
+    {
+        "id": "TC-014",
+        "description": "Closed case from years ago is not an emergency",
+        "input": "He was arrested in 2019 and the case is closed",
+        "must_not_contain": ["urgent alert", "right to remain silent"],
+        "category": "urgency"
+    },
+    {
+        "id": "TC-015",
+        "description": "Everyday mention of police and kids is not an emergency",
+        "input": "The police took my kids to school",
+        "must_not_contain": ["urgent alert", "right to remain silent"],
+        "category": "urgency"
+    },
+    {
+        "id": "TC-016",
+        "description": "Asking about someone arrested in the past is not an emergency",
+        "input": "I just have a question about my brother who was arrested",
+        "must_not_contain": ["urgent alert", "right to remain silent"],
+        "category": "urgency"
+    },
+    {
+        "id": "TC-017",
+        "description": "General question about immigration detention is not an emergency",
+        "input": "I just want to know if you handle people who were detained by immigration",
+        "must_not_contain": ["urgent alert", "right to remain silent"],
+        "category": "urgency"
+    },
+    {
+        "id": "TC-018",
+        "description": "Asking whether the firm takes custody emergencies is not an emergency",
+        "input": "Do you handle custody emergency cases? Just curious about fees",
+        "must_not_contain": ["urgent alert", "right to remain silent"],
+        "category": "urgency"
+    },
+    {
+        "id": "TC-019",
+        "description": "A lawyer referring a client is not an emergency",
+        "input": "My client was arrested, I am a lawyer calling today to refer",
+        "must_not_contain": ["urgent alert", "right to remain silent"],
+        "category": "urgency"
     }
 ]
 
-def run_test(test:dict)-> dict:
+# Replayed responses live here, keyed on everything that can change an answer:
+# the system prompt, the model id, the tool schemas, the knowledge base, the
+# source of every module in agent/, and the caller's turns.
+# Edit any of those and the affected cases hit Bedrock again.
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".eval_cache.json")
+AGENT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "agent")
+_cache_lock = threading.Lock()
+
+
+def case_turns(test: dict) -> list[str]:
+    return test.get("turns") or [test["input"]]
+
+
+def source_hash(directory: str = AGENT_DIR) -> str:
+    """One hash over every module in ``directory``, names included."""
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".py"):
+            continue
+        digest.update(name.encode() + b"\0")
+        with open(os.path.join(directory, name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def agent_fingerprint() -> str:
+    schemas = [convert_to_openai_tool(t) for t in ALL_TOOLS]
+    payload = json.dumps({
+        "system_prompt": hashlib.sha256(CLARA_SYSTEM_PROMPT.encode()).hexdigest(),
+        "model_id": MODEL_ID,
+        "tools": schemas,
+        "kb_version": kb_version(),
+        "agent_source": source_hash()
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def cache_key(fingerprint: str, turns: list[str]) -> str:
+    return hashlib.sha256(json.dumps([fingerprint, turns]).encode()).hexdigest()
+
+
+def load_cache() -> dict:
+    try:
+        with open(CACHE_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(cache: dict):
+    with _cache_lock, open(CACHE_PATH, "w") as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+
+def score_response(test: dict, response: str) -> tuple[bool, list[str]]:
+    response_lower = response.lower()
+
+    contain_pass = True
+    if test.get("must_contain"):
+        contain_pass = any(
+            kw.lower() in response_lower
+            for kw in test["must_contain"]
+        )
+
+    not_contain_pass = True
+    violated = []
+    for kw in test.get("must_not_contain", []):
+        if kw.lower() in response_lower:
+            not_contain_pass = False
+            violated.append(kw)
+
+    return contain_pass and not_contain_pass, violated
+
+
+def case_result(test: dict, response: str, cached: bool, seconds: float, error: bool = False) -> dict:
+    passed, violated = (False, []) if error else score_response(test, response)
+    return {
+        "id": test["id"],
+        "description": test["description"],
+        "category": test["category"],
+        "passed": passed,
+        "violated": violated,
+        "response": response,
+        "cached": cached,
+        "seconds": seconds
+    }
+
+
+def run_test(test: dict, cache: dict = None, fingerprint: str = "") -> dict:
+    started = time.perf_counter()
+    turns = case_turns(test)
+    key = cache_key(fingerprint, turns)
+    cached = False
+
     try:
-        response = run_single_query(test["input"])
-        response_lower = response.lower()
-
-        continue_pass= True
-        if test.get("must_contain"):
-            contain_pass = any(
-                kw.lower() in response_lower
-                for kw in test["must_contain"]
-            )
-
-        not_contain_pass = True
-        violated = []
-        for kw in test.get("must_not_contain", []):
-            if kw.lower() in response_lower:
-                not_contain_pass = False
-                violated.append(kw)
-
-        passed = contain_pass and not_contain_pass
-
-        return {
-            "id": test["id"],
-            "description": test["description"],
-            "category": test["category"],
-            "passed": passed,
-            "violated": violated,
-            "response": response
-        }
+        with _cache_lock:
+            responses = cache.get(key) if cache is not None else None
+        if responses is not None:
+            cached = True
+        else:
+            responses = run_conversation(turns)
+            if cache is not None:
+                with _cache_lock:
+                    cache[key] = responses
+        return case_result(test, responses[-1], cached, time.perf_counter() - started)
 
     except Exception as e:
-        return {
-            "id": test["id"],
-            "description": test["description"],
-            "category": test["category"],
-            "passed": False,
-            "violated": [],
-            "response": str(e)
-        }
-
-def run_all_evals():
+        return case_result(test, str(e), cached, time.perf_counter() - started, error=True)
+
+
+def conversation_worker(turns: list[str], conn):
+    """Body of a case's own process: run the conversation, send back the replies."""
+    try:
+        conn.send(("started", None))
+        conn.send(("ok", run_conversation(turns)))
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+
+def run_all_evals(workers: int = 8, timeout: float = 90.0, use_cache: bool = True, refresh: bool = False):
+    """Run every case and print the scorecard; True if Clara may be deployed.
+
+    Each case that isn't replayed runs in a process of its own, which is
+    killed once its conversation has run for ``timeout`` seconds (or once
+    it has taken that long just to start), so a hung Bedrock call fails its
+    case instead of hanging the run.
+    """
     console.print(Panel(
         "[bold]Clara Eval Suite[/bold]\n"
         "Running before deployment...",
         border_style="yellow"
     ))
 
-    results = []
+    cache = None
+    fingerprint = agent_fingerprint()
+    if use_cache:
+        cache = {} if refresh else load_cache()
+
+    results = {}
     table = Table(title="Eval Results", header_style="bold")
     table.add_column("ID", width=8)
     table.add_column("Category", width=12)
-    table.add_column("Description", width=40)
+    table.add_column("Description", width=32)
+    table.add_column("Time", width=7)
     table.add_column("Result", width=10)
 
+    context = multiprocessing.get_context("spawn")
+    waiting = list(TEST_CASES)
+    running = {}
+
     with console.status("[yellow]Running evals...[/yellow]") as status:
-        for i, test in enumerate(TEST_CASES):
-            status.update(f"Running {test['id']} ({i+1}/{len(TEST_CASES)})...")
-            result = run_test(test)
-            results.append(result)
-            table.add_row(
-                result["id"],
-                result["category"],
-                result["description"],
-                "PASS ✅" if result["passed"] else "FAIL ❌"
-            )
+        while waiting or running:
+            while waiting and len(running) < workers:
+                test = waiting.pop(0)
+                turns = case_turns(test)
+                key = cache_key(fingerprint, turns)
+                responses = cache.get(key) if cache is not None else None
+                if responses is not None:
+                    results[test["id"]] = case_result(test, responses[-1], True, 0.0)
+                    continue
+                receiver, sender = context.Pipe(duplex=False)
+                process = context.Process(target=conversation_worker, args=(turns, sender), daemon=True)
+                process.start()
+                sender.close()
+                running[test["id"]] = (test, key, process, receiver, time.monotonic())
+
+            for case_id, (test, key, process, receiver, begun) in list(running.items()):
+                seconds = time.monotonic() - begun
+                if receiver.poll():
+                    try:
+                        outcome, payload = receiver.recv()
+                    except EOFError:
+                        outcome, payload = "error", f"Case process exited with code {process.exitcode}"
+                    if outcome == "started":
+                        # The case's clock starts once its process is up.
+                        running[case_id] = (test, key, process, receiver, time.monotonic())
+                        continue
+                elif seconds > timeout:
+                    process.kill()
+                    outcome, payload = "error", f"Timed out after {timeout:.0f}s"
+                else:
+                    continue
+                process.join()
+                receiver.close()
+                del running[case_id]
+                if outcome == "ok":
+                    if cache is not None:
+                        cache[key] = payload
+                    results[case_id] = case_result(test, payload[-1], False, seconds)
+                else:
+                    results[case_id] = case_result(test, payload, False, seconds, error=True)
+
+            status.update(f"Running evals ({len(results)}/{len(TEST_CASES)} done)...")
+            time.sleep(0.1)
+
+    if cache is not None:
+        save_cache(cache)
+
+    results = [results[test["id"]] for test in TEST_CASES]
+    for result in results:
+        table.add_row(
+            result["id"],
+            result["category"],
+            result["description"],
+            "cached" if result["cached"] else f"{result['seconds']:.1f}s",
+            "PASS ✅" if result["passed"] else "FAIL ❌"
+        )
 
     console.print(table)
 
@@ -163,5 +404,17 @@ def run_all_evals():
 
 
 if __name__ == "__main__":
-    deployable = run_all_evals()
+    parser = argparse.ArgumentParser(description="Run Clara's deployment evals.")
+    parser.add_argument("--workers", type=int, default=8, help="Cases run concurrently")
+    parser.add_argument("--timeout", type=float, default=90.0, help="Seconds allowed per case")
+    parser.add_argument("--no-cache", action="store_true", help="Always call the model, never replay")
+    parser.add_argument("--refresh", action="store_true", help="Ignore replayed answers and re-record them")
+    args = parser.parse_args()
+
+    deployable = run_all_evals(
+        workers=args.workers,
+        timeout=args.timeout,
+        use_cache=not args.no_cache,
+        refresh=args.refresh
+    )
     sys.exit(0 if deployable else 1)